@@ -1 +1,5 @@
 from .esxi import ESXi
+
+__all__ = [
+    "ESXi",
+]
@@ -0,0 +1,124 @@
+import threading
+from concurrent.futures import Future
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List
+)
+
+from pyVmomi import (
+    vim,
+    vmodl
+)
+
+_TASK_PATH_SET = ['info.state', 'info.result', 'info.error']
+_MAX_WAIT_SECONDS = 30
+
+_property_collectors: Dict[Any, vmodl.query.PropertyCollector] = {}
+_property_collectors_lock = threading.Lock()
+
+
+class TaskFuture(Future):
+    def __init__(
+        self,
+        task: vim.Task,
+        on_success: Callable[[Any], Any] = None
+    ) -> None:
+        super().__init__()
+        self.task = task
+        self.on_success = on_success
+
+    def __repr__(self) -> str:
+        return f'TaskFuture(task={self.task!r})'
+
+    def _resolve(self, task_info: Dict[str, Any]) -> None:
+        state = task_info.get('info.state')
+        if state == vim.TaskInfo.State.error:
+            self.set_exception(task_info.get('info.error'))
+            return
+
+        result = task_info.get('info.result')
+        if self.on_success is None:
+            self.set_result(result)
+            return
+        try:
+            self.set_result(self.on_success(result))
+        except Exception as e:
+            self.set_exception(e)
+
+
+def get_property_collector(stub: Any) -> vmodl.query.PropertyCollector:
+    # Reading ServiceInstance.content is a round trip, so remember the
+    # root collector of each connection
+    with _property_collectors_lock:
+        property_collector = _property_collectors.get(stub)
+    if property_collector is None:
+        si = vim.ServiceInstance("ServiceInstance", stub)
+        property_collector = si.content.propertyCollector
+        with _property_collectors_lock:
+            _property_collectors[stub] = property_collector
+    return property_collector
+
+
+def submit(
+    task: vim.Task,
+    on_success: Callable[[Any], Any] = None
+) -> TaskFuture:
+    return TaskFuture(task, on_success)
+
+
+def run_until_complete(futures: List[TaskFuture]) -> None:
+    pending = {future.task._moId: future
+               for future in futures if not future.done()}
+    if not pending:
+        return
+
+    # Already resolved futures (e.g. push-mode imports) may have no task
+    property_collector = get_property_collector(
+        next(iter(pending.values())).task._stub
+    ).CreatePropertyCollector()
+    try:
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(
+            objectSet=[
+                vmodl.query.PropertyCollector.ObjectSpec(obj=future.task)
+                for future in pending.values()
+            ],
+            propSet=[
+                vmodl.query.PropertyCollector.PropertySpec(
+                    type=vim.Task,
+                    pathSet=_TASK_PATH_SET
+                )
+            ]
+        )
+        property_collector.CreateFilter(filter_spec, True)
+        wait_options = vmodl.query.PropertyCollector.WaitOptions(
+            maxWaitSeconds=_MAX_WAIT_SECONDS
+        )
+
+        task_infos = {task_id: {} for task_id in pending}
+        version = None
+        while pending:
+            update_set = property_collector.WaitForUpdatesEx(version,
+                                                             wait_options)
+            if update_set is None:
+                continue
+            version = update_set.version
+
+            for filter_update in update_set.filterSet:
+                for object_update in filter_update.objectSet:
+                    task_id = object_update.obj._moId
+                    if task_id not in pending:
+                        continue
+
+                    task_info = task_infos[task_id]
+                    for change in object_update.changeSet:
+                        task_info[change.name] = change.val
+
+                    if task_info.get('info.state') in (
+                        vim.TaskInfo.State.success,
+                        vim.TaskInfo.State.error
+                    ):
+                        pending.pop(task_id)._resolve(task_info)
+    finally:
+        property_collector.Destroy()
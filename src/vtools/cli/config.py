@@ -4,6 +4,11 @@ import typer
 from typing_extensions import Annotated
 from rich.console import Console
 
+from vtools.daemon import (
+    IDLE_TIMEOUT_IN_MINUTES,
+    SessionDaemon,
+    request_session_cookie
+)
 from vtools.esxi import ESXi
 from vtools.exception import handle_exceptions
 
@@ -39,11 +44,45 @@ def get_config():
         console.print(f'{config_key} = {connection_config.get(config_key)}')
 
 
-@handle_exceptions()
+@app.command(name='daemon', help='Keep one connection open and share it across commands.')
+def run_daemon(
+    idle_timeout: Annotated[int, typer.Option(help="Minutes without requests before exiting")] = IDLE_TIMEOUT_IN_MINUTES
+):
+    if not pre:
+        console.print("Connection configuration not set.")
+        console.print("Please use command 'vtools-cli config set --ip <HostIP> --user <username> --pwd <password>'")
+        return
+
+    connection_config = config['CONNECTION']
+    session_daemon = handle_exceptions(SessionDaemon)(
+        ip=connection_config.get('ip'),
+        user=connection_config.get('user'),
+        pwd=connection_config.get('pwd'),
+        idle_timeout_in_minutes=idle_timeout
+    )
+    session_daemon.serve_forever()
+
+
+class Connection:
+    def __init__(self) -> None:
+        self._esxi = None
+
+    @property
+    def esxi(self) -> ESXi:
+        if self._esxi is None:
+            self._esxi = connect()
+        return self._esxi
+
+
+@handle_exceptions
 def connect():
     connection_config = config['CONNECTION']
     return ESXi(
         ip=connection_config.get('ip'),
         user=connection_config.get('user'),
-        pwd=connection_config.get('pwd')
+        pwd=connection_config.get('pwd'),
+        session_cookie=request_session_cookie(
+            connection_config.get('ip'),
+            connection_config.get('user')
+        )
     )
@@ -5,45 +5,57 @@ from rich.console import Console
 from rich.table import Table
 from typing_extensions import Annotated
 
-from vtools.cli.config import connect
+from vtools.cli.config import Connection
+from vtools.device import DiskBackingType, ScsiControllerCreateSpec, ScsiControllerType
 from vtools.query import by
 from pyVmomi import vim
 
+_DISK_PROVISIONING = {
+    'thin': (True, False),
+    'thick': (False, False),
+    'eager': (False, True),
+}
+
 app = typer.Typer()
 console = Console()
 
 
 @app.command(name='add_controller', help='add scsi controller for disk management')
-def add_scsi_controller(vm_name: Annotated[str, typer.Argument(help="The name VM to add controller")]):
-    esxi = connect()
+def add_scsi_controller(ctx: typer.Context, vm_name: Annotated[str, typer.Argument(help="The name VM to add controller")]):
+    esxi = ctx.ensure_object(Connection).esxi
 
-    vm_obj = esxi.vm_manager().get(lambda vm: vm.name == vm_name)
+    vm_obj = esxi.vms.get_by_name(vm_name)
     if vm_obj is None:
         console.print(f"The VM '{vm_name}' does not exists!")
         sys.exit()
-    if [disk_vm_obj for disk_vm_obj in vm_obj.disk_manager().list()
-            if isinstance(disk_vm_obj.vim_obj, vim.vm.device.ParaVirtualSCSIController)]:
+    if any(isinstance(controller.vim_obj, vim.vm.device.ParaVirtualSCSIController)
+           for controller in vm_obj.scsi_controllers.list()):
         console.print("An scsi controller already exists!")
         sys.exit()
-    esxi.vm_manager().add_scsi_controller(vm_obj)
+    vm_obj.scsi_controllers.add(ScsiControllerCreateSpec(ScsiControllerType.ParaVirtualSCSI))
     console.print(f"Added ParaVirtualSCSIController to {vm_name}")
 
 
 @app.command(name='remove_controller', help='remove scsi controller for disk management')
-def remove_scsi_controller(vm_name: Annotated[str, typer.Argument(help="The name VM to remove controller")],
+def remove_scsi_controller(ctx: typer.Context, vm_name: Annotated[str, typer.Argument(help="The name VM to remove controller")],
                            controller_number: Annotated[int, typer.Argument(help="The name VM to remove disk")]):
-    esxi = connect()
+    esxi = ctx.ensure_object(Connection).esxi
 
-    vm_obj = esxi.vm_manager().get(lambda vm: vm.name == vm_name)
+    vm_obj = esxi.vms.get_by_name(vm_name)
     if vm_obj is None:
         console.print(f"The VM '{vm_name}' does not exists!")
         sys.exit()
-    esxi.vm_manager().remove_scsi_controller(vm_obj, controller_number)
+    controller = vm_obj.scsi_controllers.get(lambda c: c.vim_obj.busNumber == controller_number)
+    if controller is None:
+        console.print(f"The SCSI controller {controller_number} does not exists!")
+        sys.exit()
+    vm_obj.scsi_controllers.remove(controller)
     console.print(f"Removed ParaVirtualSCSIController{controller_number} from {vm_name}")
 
 
 @app.command(name="list", help='List all the disks attached to a VM')
 def query_disk(
+        ctx: typer.Context,
         vm_name: Annotated[str, typer.Argument(help="The name of the VM to list disk")],
         field: Annotated[str, typer.Option(help="The field to filter on")] = None,
         condition: Annotated[str, typer.Option(help="The condition to apply")] = None
@@ -51,18 +63,18 @@ def query_disk(
     if (field is None) ^ (condition is None):
         raise typer.BadParameter("Both 'field' and 'condition' need to be provided together")
 
-    esxi = connect()
+    esxi = ctx.ensure_object(Connection).esxi
 
-    vm_obj = esxi.vm_manager().get(lambda vm: vm.name == vm_name)
+    vm_obj = esxi.vms.get_by_name(vm_name)
     if vm_obj is None:
         console.print(f"The VM '{vm_name}' does not exists!")
         sys.exit()
 
     table = Table(show_header=True, header_style="bold magenta")
     if field is None:
-        disks = vm_obj.disk_manager().list()
+        disks = vm_obj.disks.list()
     else:
-        disks = vm_obj.disk_manager().list(by(field, eval(condition)))
+        disks = vm_obj.disks.list(by(field, eval(condition)))
     table.add_column("Disk Name", style="dim")
     table.add_column("Size", style="dim")
     for disk in disks:
@@ -71,28 +83,36 @@ def query_disk(
 
 
 @app.command(name="add", help='Attach a disk to a VM')
-def add_disk(vm_name: Annotated[str, typer.Argument(help="The name of the VM to add the disk")],
+def add_disk(ctx: typer.Context, vm_name: Annotated[str, typer.Argument(help="The name of the VM to add the disk")],
              disk_size: Annotated[int, typer.Argument(help="The size (in GB) of the disk to add")],
-             disk_type: Annotated[str, typer.Option(help="The type of the disk")] = 'thin'):
-    esxi = connect()
-    vm_obj = esxi.vm_manager().get(lambda vm: vm.name == vm_name)
+             disk_type: Annotated[str, typer.Option(help="The type of the disk: thin, thick or eager")] = 'thin'):
+    if disk_type not in _DISK_PROVISIONING:
+        raise typer.BadParameter(f"Unknown disk type '{disk_type}'")
+
+    esxi = ctx.ensure_object(Connection).esxi
+    vm_obj = esxi.vms.get_by_name(vm_name)
     if vm_obj is None:
         console.print(f"The VM '{vm_name}' does not exists!")
         sys.exit()
-    vm_obj.disk_manager().add_disk(disk_size, disk_type)
-    console.print("A %sGB disk is added to the %s" % (disk_size, vm_obj.vim_obj.config.name))
+    thin, eager = _DISK_PROVISIONING[disk_type]
+    vm_obj.disks.add(disk_size * 1024, DiskBackingType.flat_v2(thin=thin, eager=eager))
+    console.print("A %sGB disk is added to the %s" % (disk_size, vm_obj.name))
 
 
 @app.command(name="remove", help='Remove a disk attached to a VM')
-def remove_disk(vm_name: Annotated[str, typer.Argument(help="The name VM to remove disk")],
+def remove_disk(ctx: typer.Context, vm_name: Annotated[str, typer.Argument(help="The name VM to remove disk")],
                 disk_number: Annotated[int, typer.Argument(help="The name VM to remove disk")]):
-    esxi = connect()
-    vm_obj = esxi.vm_manager().get(lambda vm: vm.name == vm_name)
+    esxi = ctx.ensure_object(Connection).esxi
+    vm_obj = esxi.vms.get_by_name(vm_name)
     if vm_obj is None:
         console.print(f"The VM '{vm_name}' does not exists!")
         sys.exit()
-    vm_obj.disk_manager().remove_disk(disk_number)
-    console.print("The disk %s is removed from %s" % (disk_number, vm_obj.vim_obj.config.name))
+    disk = vm_obj.disks.get_by_name(f"Hard disk {disk_number}")
+    if disk is None:
+        console.print(f"The disk {disk_number} does not exists!")
+        sys.exit()
+    vm_obj.disks.remove(disk)
+    console.print("The disk %s is removed from %s" % (disk_number, vm_obj.name))
 
 
 if __name__ == "__main__":
@@ -7,18 +7,31 @@ from vtools.cli import (
     vm,
     datastore,
 )
+from vtools.cli.config import Connection
+from vtools.exception import VToolsError
 
 logger.remove(0)
 logger.add(sys.stderr, level="ERROR")
 
 app = typer.Typer()
+
+
+@app.callback()
+def _main(ctx: typer.Context):
+    ctx.obj = Connection()
+
+
 app.add_typer(config.app, name='config', help="Operations related to connection configuration")
 app.add_typer(vm.app, name="vm", help="Operations related to Virtual Machines (VM)")
 app.add_typer(datastore.app, name="datastore", help="Operations related to datastore")
 
 
 def main():
-    app()
+    try:
+        app()
+    except VToolsError as e:
+        logger.error(f"{type(e).__name__}: {e}")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
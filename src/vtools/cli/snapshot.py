@@ -5,16 +5,23 @@ from rich.console import Console
 from rich.table import Table
 from typing_extensions import Annotated
 
-from vtools.cli.config import connect
+from vtools.cli.config import Connection
+from vtools.snapshot import MEMORY, QUIESCED, SIMPLE
+
+_SNAPSHOT_TYPES = {
+    'simple': SIMPLE,
+    'quiesced': QUIESCED,
+    'memory': MEMORY,
+}
 
 app = typer.Typer()
 console = Console()
 
 
 @app.command(name='list', help='list all the snapshot of the VM')
-def list_snapshot(vm_name: Annotated[str, typer.Argument(help="The name of VM to list its snapshots")]):
-    esxi = connect()
-    vm_obj = esxi.vms.get(lambda vm: vm.name == vm_name)
+def list_snapshot(ctx: typer.Context, vm_name: Annotated[str, typer.Argument(help="The name of VM to list its snapshots")]):
+    esxi = ctx.ensure_object(Connection).esxi
+    vm_obj = esxi.vms.get_by_name(vm_name)
     if vm_obj is None:
         console.print(f"The VM '{vm_name}' does not exists!")
         return
@@ -29,28 +36,37 @@ def list_snapshot(vm_name: Annotated[str, typer.Argument(help="The name of VM to
 
 
 @app.command(name='create', help='create a new snapshot of the VM')
-def create_snapshot(vm_name: Annotated[str, typer.Option(help="The VM to take the snapshot")],
-                    snapshot_name: Annotated[str, typer.Option(help="The name of snapshot")]):
-    esxi = connect()
-    vm_obj = esxi.vms.get(lambda vm: vm.name == vm_name)
+def create_snapshot(ctx: typer.Context, vm_name: Annotated[str, typer.Option(help="The VM to take the snapshot")],
+                    snapshot_name: Annotated[str, typer.Option(help="The name of snapshot")],
+                    snapshot_type: Annotated[str, typer.Option(help="The type of snapshot: simple, quiesced or memory")] = 'simple'):
+    if snapshot_type not in _SNAPSHOT_TYPES:
+        raise typer.BadParameter(f"Unknown snapshot type '{snapshot_type}'")
+
+    esxi = ctx.ensure_object(Connection).esxi
+    vm_obj = esxi.vms.get_by_name(vm_name)
     if vm_obj is None:
         console.print(f"The VM '{vm_name}' does not exists!")
         return
 
-    new_snapshot = vm_obj.snapshots.create(name=snapshot_name, description=f"This is a test for {snapshot_name}")
+    new_snapshot = vm_obj.snapshots.create(name=snapshot_name,
+                                           snapshot_type=_SNAPSHOT_TYPES[snapshot_type],
+                                           description=f"This is a test for {snapshot_name}")
     console.print(f"Created Snapshot '{snapshot_name}' on VM '{vm_obj.name}'")
 
 
 @app.command(name='delete', help='destroy a snapshot of the VM')
-def destroy_snapshot(vm_name: Annotated[str, typer.Option(help="The VM corresponding to the snapshot")],
+def destroy_snapshot(ctx: typer.Context, vm_name: Annotated[str, typer.Option(help="The VM corresponding to the snapshot")],
                      snapshot_name: Annotated[str, typer.Option(help="The snapshot to destroy")]):
-    esxi = connect()
-    target_vm = esxi.vms.get(lambda vm: vm.name == vm_name)
+    esxi = ctx.ensure_object(Connection).esxi
+    target_vm = esxi.vms.get_by_name(vm_name)
     if target_vm is None:
         console.print(f"The VM '{vm_name}' does not exists!")
         return
 
-    target_snapshot = target_vm.snapshots.get(lambda snapshot: snapshot.name == snapshot_name)
+    target_snapshot = target_vm.snapshots.get_by_name(snapshot_name)
+    if target_snapshot is None:
+        console.print(f"The snapshot '{snapshot_name}' does not exists on VM '{vm_name}'!")
+        return
 
     target_vm.snapshots.delete(target_snapshot)
     console.print(f"Deleted Snapshot '{snapshot_name}' on VM '{vm_name}'")
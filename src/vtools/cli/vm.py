@@ -10,13 +10,12 @@ from vtools.cli import (
     disk,
     snapshot
 )
-from vtools.cli.config import connect
+from vtools.cli.config import Connection
 from vtools.query import by
 from vtools.vm import (
     from_ovf,
     from_scratch
 )
-from vtools.query import by_name
 
 console = Console()
 
@@ -31,13 +30,14 @@ app.add_typer(snapshot.app, name="snapshot", help="Operations related to Snapsho
 
 @app.command(name='list', help='List VMs')
 def query(
+    ctx: typer.Context,
     field: Annotated[str, typer.Option(help="The field to filter on")] = None,
     condition: Annotated[str, typer.Option(help="The condition to apply, i.e. lambda val: val == 'vm1'")] = None
 ):
     if (field is None) ^ (condition is None):
         raise typer.BadParameter("Both 'field' and 'condition' need to be provided together")
 
-    esxi = connect()
+    esxi = ctx.ensure_object(Connection).esxi
 
     table = Table(show_header=True, header_style="bold magenta")
     if field is None:
@@ -58,37 +58,37 @@ def query(
 
 
 @app.command(name='power_on', help='Power on the VM')
-def power_on(vm_name: Annotated[str, typer.Argument(help="The name VM to power on")]):
-    esxi = connect()
-    vm_obj = esxi.vms.get(lambda vm: vm.name == vm_name)
+def power_on(ctx: typer.Context, vm_name: Annotated[str, typer.Argument(help="The name VM to power on")]):
+    esxi = ctx.ensure_object(Connection).esxi
+    vm_obj = esxi.vms.get_by_name(vm_name)
     vm_obj.power_on()
 
 
 @app.command(name='power_off', help='Power off the VM')
-def power_off(vm_name: Annotated[str, typer.Argument(help="The name VM to power off")]):
-    esxi = connect()
-    vm_obj = esxi.vms.get(lambda vm: vm.name == vm_name)
+def power_off(ctx: typer.Context, vm_name: Annotated[str, typer.Argument(help="The name VM to power off")]):
+    esxi = ctx.ensure_object(Connection).esxi
+    vm_obj = esxi.vms.get_by_name(vm_name)
     vm_obj.power_off()
 
 
 @app.command(name='suspend', help='Suspend the VM')
-def suspend(vm_name: Annotated[str, typer.Argument(help="The name VM to suspend")]):
-    esxi = connect()
-    vm_obj = esxi.vms.get(lambda vm: vm.name == vm_name)
+def suspend(ctx: typer.Context, vm_name: Annotated[str, typer.Argument(help="The name VM to suspend")]):
+    esxi = ctx.ensure_object(Connection).esxi
+    vm_obj = esxi.vms.get_by_name(vm_name)
     vm_obj.suspend()
 
 
 @create_app.command(name='from_ovf', help='Create a new VM from OVF')
-def create_from_ovf(vm_name: Annotated[str, typer.Option(help="The name of VM to create")],
+def create_from_ovf(ctx: typer.Context, vm_name: Annotated[str, typer.Option(help="The name of VM to create")],
                     ovf_url: Annotated[str, typer.Option(help="The ovf file url")],
                     datastore: Annotated[str, typer.Option(help="The place to store the VM created")]):
-    esxi = connect()
+    esxi = ctx.ensure_object(Connection).esxi
     import_spec = from_ovf(ovf_url)
 
     new_vm = esxi.vms.create(
         name=vm_name,
         spec=import_spec,
-        datastore=esxi.datastores.get(by_name(lambda v: v == datastore))
+        datastore=esxi.datastores.get_by_name(datastore)
     )
     table = Table(show_header=True, header_style="bold magenta")
     table.add_column("Vm Name", style="dim")
@@ -102,13 +102,13 @@ def create_from_ovf(vm_name: Annotated[str, typer.Option(help="The name of VM to
 
 
 @create_app.command(name='from_scratch', help='Create a new VM from scratch')
-def create_from_scratch(vm_name: Annotated[str, typer.Option(help="The name of VM to create")],
+def create_from_scratch(ctx: typer.Context, vm_name: Annotated[str, typer.Option(help="The name of VM to create")],
                         datastore: Annotated[str, typer.Option(help="The place to store the VM created")],
                         cpu_number: Annotated[int, typer.Option(help="The number of CPUs of the VM")] = 1,
                         cpu_cores_per_socket: Annotated[int, typer.Option(help="The CPU cores per socket of the VM")] = 1,
                         memory_size: Annotated[int, typer.Option(help="The size of VM memory in MB")] = 128,
                         guest_id: Annotated[str, typer.Option(help="Short guest OS identifier")] = 'otherGuest'):
-    esxi = connect()
+    esxi = ctx.ensure_object(Connection).esxi
     create_spec = from_scratch(esxi.get_vm_config_option())
     create_spec.set_cpu(cpu_number, cpu_cores_per_socket)
     create_spec.set_memory(memory_size)
@@ -117,7 +117,7 @@ def create_from_scratch(vm_name: Annotated[str, typer.Option(help="The name of V
     new_vm = esxi.vms.create(
         name=vm_name,
         spec=create_spec,
-        datastore=esxi.datastores.get(by_name(lambda v: v == datastore))
+        datastore=esxi.datastores.get_by_name(datastore)
     )
     table = Table(show_header=True, header_style="bold magenta")
     table.add_column("Vm Name", style="dim")
@@ -131,10 +131,10 @@ def create_from_scratch(vm_name: Annotated[str, typer.Option(help="The name of V
 
 
 @app.command(help='Delete a VM')
-def delete(vm_name: Annotated[str, typer.Option(help="The name of VM to destroy")]):
-    esxi = connect()
+def delete(ctx: typer.Context, vm_name: Annotated[str, typer.Option(help="The name of VM to destroy")]):
+    esxi = ctx.ensure_object(Connection).esxi
 
-    target_vm = esxi.vms.get(lambda vm: vm.name == vm_name)
+    target_vm = esxi.vms.get_by_name(vm_name)
     if not target_vm:
         console.print(f'Failed to find VM "{vm_name}"!')
         return
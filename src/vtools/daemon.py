@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from multiprocessing.connection import (
+    Client,
+    Listener
+)
+from typing import Optional
+
+from loguru import logger
+
+from vtools.esxi import ESXi
+from vtools.exception import InvalidStateError
+
+SOCKET_FILE = os.path.expanduser("~/.vtools.sock")
+IDLE_TIMEOUT_IN_MINUTES = 10
+
+_SESSION_REQUEST = 'session'
+_STOP_REQUEST = 'stop'
+
+
+def request_session_cookie(ip: str, user: str) -> Optional[str]:
+    if not os.path.exists(SOCKET_FILE):
+        return None
+
+    try:
+        with Client(SOCKET_FILE, family='AF_UNIX') as connection:
+            connection.send((_SESSION_REQUEST, ip, user))
+            return connection.recv()
+    except (OSError, EOFError) as e:
+        logger.warning(f'Failed to reach vtools daemon at "{SOCKET_FILE}": {e}')
+        return None
+
+
+def _is_daemon_alive() -> bool:
+    try:
+        with Client(SOCKET_FILE, family='AF_UNIX'):
+            return True
+    except OSError:
+        return False
+
+
+class SessionDaemon:
+    def __init__(
+        self,
+        ip: str,
+        user: str,
+        pwd: str,
+        idle_timeout_in_minutes: int = IDLE_TIMEOUT_IN_MINUTES
+    ) -> None:
+        self.esxi = ESXi(ip=ip, user=user, pwd=pwd)
+        self.idle_timeout = idle_timeout_in_minutes * 60
+        self._last_request_time = time.monotonic()
+        self._stopped = threading.Event()
+
+    @property
+    def session_cookie(self) -> str:
+        if self.esxi._si.content.sessionManager.currentSession is None:
+            logger.info('Daemon session expired, logging in again')
+            self.esxi._login()
+        return self.esxi._si._stub.cookie
+
+    def serve_forever(self) -> None:
+        if os.path.exists(SOCKET_FILE):
+            if _is_daemon_alive():
+                raise InvalidStateError(
+                    f'Another vtools daemon is listening on "{SOCKET_FILE}"'
+                )
+            os.remove(SOCKET_FILE)
+
+        old_umask = os.umask(0o177)
+        try:
+            listener = Listener(SOCKET_FILE, family='AF_UNIX')
+        finally:
+            os.umask(old_umask)
+
+        watchdog = threading.Thread(target=self._stop_when_idle, daemon=True)
+        watchdog.start()
+        logger.info(f'vtools daemon listening on "{SOCKET_FILE}"')
+
+        with listener:
+            while not self._stopped.is_set():
+                with listener.accept() as connection:
+                    self._handle(connection)
+
+    def _handle(self, connection) -> None:
+        # A bad request or a failed re-login must not take the daemon down
+        try:
+            request = connection.recv()
+        except EOFError:
+            return
+        except Exception as e:
+            logger.error(f'Failed to read daemon request: {e}')
+            return
+
+        if isinstance(request, tuple) and request[:1] == (_STOP_REQUEST,):
+            self._stopped.set()
+            return
+
+        try:
+            session_cookie = self._get_session_cookie_for(request)
+        except Exception as e:
+            logger.error(f'Failed to handle daemon request {request!r}: {e}')
+            session_cookie = None
+
+        try:
+            connection.send(session_cookie)
+        except OSError as e:
+            logger.warning(f'Failed to reply to daemon client: {e}')
+
+    def _get_session_cookie_for(self, request) -> Optional[str]:
+        if (
+            not isinstance(request, tuple)
+            or
+            len(request) != 3
+            or
+            request[0] != _SESSION_REQUEST
+        ):
+            raise ValueError('Malformed session request')
+
+        self._last_request_time = time.monotonic()
+        _, ip, user = request
+        if ip != self.esxi.ip or user != self.esxi.user:
+            return None
+        return self.session_cookie
+
+    def _stop_when_idle(self) -> None:
+        while True:
+            idle_time = time.monotonic() - self._last_request_time
+            if idle_time >= self.idle_timeout:
+                break
+            time.sleep(self.idle_timeout - idle_time)
+
+        logger.info('vtools daemon idled out')
+        # Listener.accept() is not interrupted by closing the socket from
+        # another thread, so wake it up with a stop request instead.
+        with Client(SOCKET_FILE, family='AF_UNIX') as connection:
+            connection.send((_STOP_REQUEST,))
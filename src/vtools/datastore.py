@@ -2,6 +2,8 @@ from pyVmomi import vim
 
 
 class Datastore:
+    __slots__ = ('vim_obj',)
+
     def __init__(
         self,
         vim_obj: vim.Datastore
@@ -1,13 +1,19 @@
 from enum import Enum
+from functools import cached_property
 from typing import (
     List,
-    Optional
+    Optional,
+    Sequence
 )
 
 from pyVmomi import vim
 
 from vtools.query import by
-from vtools.vsphere import find_device_option_by_type
+from vtools.vsphere import get_device_option_or_raise
+
+_OPERATION_ADD = vim.vm.device.VirtualDeviceSpec.Operation.add
+
+_VIRTUAL_SCSI_CONTROLLER = vim.vm.device.VirtualSCSIController
 
 
 class ScsiControllerType(Enum):
@@ -20,6 +26,12 @@ class ScsiControllerType(Enum):
         self.vim_class = clazz
 
 
+_SCSI_CONTROLLER_TYPE_BY_VIM_CLASS = {
+    controller_type.vim_class: controller_type
+    for controller_type in ScsiControllerType
+}
+
+
 class ScsiBusSharingType(Enum):
     NoSharing = (
         vim.vm.device.VirtualSCSIController.Sharing.noSharing
@@ -53,6 +65,11 @@ class DiskModeType(Enum):
         self.vim_value = value
 
 
+_DISK_MODE_TYPE_BY_VIM_VALUE = {
+    disk_mode.vim_value: disk_mode for disk_mode in DiskModeType
+}
+
+
 class DiskBackingType:
     @staticmethod
     def flat_v2(
@@ -74,6 +91,8 @@ class DiskBackingType:
 
 
 class Device:
+    __slots__ = ('vim_obj', 'vm')
+
     def __init__(
         self,
         vim_obj: vim.vm.device.VirtualDevice,
@@ -92,6 +111,8 @@ class Device:
 
 
 class Controller(Device):
+    __slots__ = ()
+
     def __init__(
         self,
         vim_obj: vim.vm.device.VirtualController,
@@ -102,39 +123,51 @@ class Controller(Device):
     def __repr__(self):
         return f'Controller(vim_obj={self.vim_obj!r})'
 
+    def __eq__(self, other):
+        # Device keys repeat across VMs, so the owning VM is part of identity
+        if isinstance(other, Controller):
+            return (self.vm.vim_obj, self.key) == (other.vm.vim_obj, other.key)
+        return False
+
+    def __hash__(self):
+        return hash((self.vm.vim_obj, self.key))
+
+    @property
+    def controller_type(self) -> Optional[ScsiControllerType]:
+        return _SCSI_CONTROLLER_TYPE_BY_VIM_CLASS.get(type(self.vim_obj))
+
     @property
     def next_free_unit(self) -> Optional[int]:
-        device_option = find_device_option_by_type(
+        return self.find_free_unit()
+
+    def find_free_unit(self, reserved: Sequence[int] = ()) -> Optional[int]:
+        device_option = get_device_option_or_raise(
             self.vm.config_option, type(self.vim_obj)
         )
         max_devices = device_option.devices.max
         used_units = self._get_used_units()
+        used_units.extend(reserved)
         if len(used_units) >= max_devices:
             return None
 
-        used_units.sort()
-        last_index = len(used_units) - 1
-        if used_units[last_index] == last_index:
-            return last_index + 1
-
-        index = 0
-        while used_units[index] == index:
-            index = index + 1
-        return index
+        for index, unit_number in enumerate(sorted(used_units)):
+            if unit_number != index:
+                return index
+        return len(used_units)
 
     def _get_used_units(self) -> List[int]:
         used_units = []
 
-        if isinstance(self.vim_obj, vim.vm.device.VirtualSCSIController):
+        if isinstance(self.vim_obj, _VIRTUAL_SCSI_CONTROLLER):
             used_units.append(self.vim_obj.scsiCtlrUnitNumber)
 
-        for device_vim_obj in self.vm.vim_obj.config.hardware.device:
-            if device_vim_obj.key in self.vim_obj.device:
-                used_units.append(device_vim_obj.unitNumber)
+        used_units.extend(self.vm._units_by_controller.get(self.key, []))
         return used_units
 
 
 class Disk(Device):
+    __slots__ = ()
+
     def __init__(
         self,
         vim_obj: vim.vm.device.VirtualDisk,
@@ -146,14 +179,22 @@ class Disk(Device):
         return f'Disk(vim_obj={self.vim_obj!r})'
 
     def __eq__(self, other):
+        # Device keys repeat across VMs, so the owning VM is part of identity
         if isinstance(other, Disk):
-            return self.key == other.key
+            return (self.vm.vim_obj, self.key) == (other.vm.vim_obj, other.key)
         return False
 
+    def __hash__(self):
+        return hash((self.vm.vim_obj, self.key))
+
     @property
     def size(self) -> str:
         return self.vim_obj.deviceInfo.summary
 
+    @property
+    def disk_mode(self) -> Optional[DiskModeType]:
+        return _DISK_MODE_TYPE_BY_VIM_VALUE.get(self.vim_obj.backing.diskMode)
+
     @property
     def controller(self) -> Controller:
         controller_key = self.vim_obj.controllerKey
@@ -164,18 +205,43 @@ class Disk(Device):
 
 class ScsiControllerCreateSpec:
     def __init__(self, controller_type: ScsiControllerType) -> None:
-        self.controller_type = controller_type
-        self.bus_sharing = ScsiBusSharingType.NoSharing
+        self._controller_type = controller_type
+        self._bus_sharing = ScsiBusSharingType.NoSharing
+
+    @property
+    def controller_type(self) -> ScsiControllerType:
+        return self._controller_type
+
+    @controller_type.setter
+    def controller_type(self, value: ScsiControllerType) -> None:
+        self._controller_type = value
+        self.invalidate()
+
+    @property
+    def bus_sharing(self) -> ScsiBusSharingType:
+        return self._bus_sharing
+
+    @bus_sharing.setter
+    def bus_sharing(self, value: ScsiBusSharingType) -> None:
+        self._bus_sharing = value
+        self.invalidate()
 
     def set_bus_sharing(self, value: ScsiBusSharingType) -> None:
         self.bus_sharing = value
 
-    @property
+    @cached_property
     def vim_device_spec(self) -> vim.vm.device.VirtualDeviceSpec:
+        return self.build()
+
+    def invalidate(self) -> None:
+        self.__dict__.pop('vim_device_spec', None)
+
+    def build_many(self, count: int) -> List[vim.vm.device.VirtualDeviceSpec]:
+        return [self.build() for _ in range(count)]
+
+    def build(self) -> vim.vm.device.VirtualDeviceSpec:
         new_device_spec = vim.vm.device.VirtualDeviceSpec()
-        new_device_spec.operation = (
-            vim.vm.device.VirtualDeviceSpec.Operation.add
-        )
+        new_device_spec.operation = _OPERATION_ADD
 
         new_controller = self.controller_type.vim_class()
         new_controller.sharedBus = self.bus_sharing.vim_value
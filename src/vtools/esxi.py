@@ -1,19 +1,44 @@
+import hashlib
 from functools import cached_property
-from typing import List
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    Tuple,
+    Union
+)
 
 from loguru import logger
 from pyVim.connect import SmartConnect
-from pyVim.task import WaitForTask
 from pyVmomi import vim
 
+from vtools.async_tasks import (
+    run_until_complete,
+    submit
+)
 from vtools.datastore import Datastore
 from vtools.exception import InvalidStateError
 from vtools.query import QueryMixin
 from vtools.vm import (
+    PREFETCHED_PROPERTY_PATHS,
     VM,
-    OvfImportSpec
+    CreateVMSpec,
+    OvfImportSpec,
+    run_power_tasks
+)
+from vtools.vsphere import (
+    collect_properties,
+    get_first_vim_obj,
+    resume_session,
+    wait_for_task
 )
-from vtools.vsphere import get_first_vim_obj
+
+_POWERED_ON = vim.VirtualMachine.PowerState.poweredOn
+_POWERED_OFF = vim.VirtualMachine.PowerState.poweredOff
+_SUSPENDED = vim.VirtualMachine.PowerState.suspended
+_CONNECTION_POOL_SIZE = 8
+
+_session_cache: Dict[Tuple[str, str, str], vim.ServiceInstance] = {}
 
 
 class ESXi:
@@ -22,16 +47,21 @@ class ESXi:
         vim_obj: vim.HostSystem = None,
         ip: str = 'localhost',
         user: str = 'root',
-        pwd: str = ''
+        pwd: str = '',
+        session_cookie: str = None
     ) -> None:
+        self._config_options = {}
+
         if vim_obj is None:
             self.ip = ip
             self.user = user
             self.pwd = pwd
+            self._session_cookie = session_cookie
 
             self._login()
         else:
             self.vim_obj = vim_obj
+            self._si = vim.ServiceInstance("ServiceInstance", vim_obj._stub)
 
             self.ip = None
             self.user = None
@@ -43,15 +73,61 @@ class ESXi:
         return False
 
     def _login(self) -> None:
-        self._si = SmartConnect(host=self.ip,
-                                user=self.user,
-                                pwd=self.pwd,
-                                disableSslCertValidation=True)
+        # The password is part of the key so other credentials never reuse
+        # a session that was authenticated with different ones
+        session_key = (self.ip, self.user,
+                       hashlib.sha256(self.pwd.encode()).hexdigest())
+        self._si = _session_cache.get(session_key)
+        if (
+            self._si is not None
+            and
+            self._si.content.sessionManager.currentSession is None
+        ):
+            self._si = None
+
+        resumed_from_cookie = False
+        if self._si is None and self._session_cookie is not None:
+            self._si = resume_session(self.ip, self._session_cookie)
+            if self._si.content.sessionManager.currentSession is None:
+                logger.info('Shared session expired, logging in again')
+                self._si = None
+            else:
+                resumed_from_cookie = True
+            self._session_cookie = None
+
+        if self._si is None:
+            self._si = SmartConnect(host=self.ip,
+                                    user=self.user,
+                                    pwd=self.pwd,
+                                    disableSslCertValidation=True)
+            # Let concurrent SOAP calls (e.g. parallel task waits) reuse
+            # pooled keep-alive connections instead of opening new ones.
+            self._si._stub.poolSize = _CONNECTION_POOL_SIZE
+        if not resumed_from_cookie:
+            # A resumed session never checked self.pwd, so don't file it
+            # under it
+            _session_cache[session_key] = self._si
         self._content = self._si.RetrieveContent()
         self.vim_obj = get_first_vim_obj(content=self._content,
                                          vim_type=vim.HostSystem)
         logger.info(f'Connected to ESXi(ip="{self.ip}") as "{self.user}"')
 
+    @cached_property
+    def _content(self) -> vim.ServiceInstanceContent:
+        return self._si.RetrieveContent()
+
+    @cached_property
+    def resource_pool(self) -> vim.ResourcePool:
+        return self.vim_obj.parent.resourcePool
+
+    @cached_property
+    def datacenter(self) -> vim.Datacenter:
+        return get_first_vim_obj(self._content, vim.Datacenter)
+
+    @cached_property
+    def vm_folder(self) -> vim.Folder:
+        return self.datacenter.vmFolder
+
     @cached_property
     def datastores(self) -> "DatastoreManager":
         return DatastoreManager(self)
@@ -64,34 +140,87 @@ class ESXi:
         self,
         hardware_version: str = None
     ) -> vim.vm.ConfigOption:
-        env_browser = self.vim_obj.parent.environmentBrowser
-        return env_browser.QueryConfigOption(hardware_version, None)
+        config_option = self._config_options.get(hardware_version)
+        if config_option is None:
+            env_browser = self.vim_obj.parent.environmentBrowser
+            config_option = env_browser.QueryConfigOption(hardware_version,
+                                                          None)
+            self._config_options[hardware_version] = config_option
+        return config_option
 
 
 class DatastoreManager(QueryMixin[Datastore]):
+    __slots__ = ('esxi',)
+
     def __init__(self, esxi: ESXi) -> None:
         self.esxi = esxi
 
-    def _list_all(self) -> List[Datastore]:
-        return [Datastore(datastore_vim_obj)
-                for datastore_vim_obj in self.esxi.vim_obj.datastore]
+    def _iter_all(self) -> Iterator[Datastore]:
+        for datastore_vim_obj in self.esxi.vim_obj.datastore:
+            yield Datastore(datastore_vim_obj)
 
 
 class VMManager(QueryMixin[VM]):
+    __slots__ = ('esxi',)
+
     def __init__(self, esxi: ESXi) -> None:
         self.esxi = esxi
 
-    def _list_all(self) -> List[VM]:
-        return [VM(vm_vim_obj) for vm_vim_obj in self.esxi.vim_obj.vm]
+    def _iter_all(self) -> Iterator[VM]:
+        vm_props = collect_properties(self.esxi._content,
+                                      vim.VirtualMachine,
+                                      PREFETCHED_PROPERTY_PATHS,
+                                      self.esxi.vim_obj)
+        for vm_vim_obj, props in vm_props.items():
+            yield VM(vm_vim_obj, props, self.esxi)
 
     def create(self, name: str, spec: OvfImportSpec,
                datastore: Datastore) -> VM:
-        return spec.create_vm(name, self.esxi, datastore)
+        new_vm = spec.create_vm(name, self.esxi, datastore)
+        self.invalidate()
+        return new_vm
+
+    def create_many(
+        self,
+        specs: List[Tuple[str, Union[CreateVMSpec, OvfImportSpec], Datastore]]
+    ) -> List[VM]:
+        futures = [spec.submit_create_vm(name, self.esxi, datastore)
+                   for name, spec, datastore in specs]
+        run_until_complete(futures)
+        self.invalidate()
+        return [future.result() for future in futures]
 
     def delete(self, vm: VM) -> None:
         if vm.esxi != self.esxi:
             raise InvalidStateError()
 
-        if vm.power_state != vim.VirtualMachine.PowerState.poweredOff:
+        if vm.power_state != _POWERED_OFF:
             vm.power_off()
-        WaitForTask(vm.vim_obj.Destroy())
+        wait_for_task(vm.vim_obj.Destroy())
+        self.invalidate()
+
+    def power_on_many(self, vms: List[VM]) -> None:
+        run_power_tasks(vms, lambda vm: vm.vim_obj.PowerOn(), _POWERED_ON)
+
+    def power_off_many(self, vms: List[VM]) -> None:
+        run_power_tasks(vms, lambda vm: vm.vim_obj.PowerOff(), _POWERED_OFF)
+
+    def suspend_many(self, vms: List[VM]) -> None:
+        run_power_tasks(vms, lambda vm: vm.vim_obj.Suspend(), _SUSPENDED)
+
+    def delete_many(self, vms: List[VM]) -> None:
+        for vm in vms:
+            if vm.esxi != self.esxi:
+                raise InvalidStateError()
+
+        power_off_futures = [submit(vm.vim_obj.PowerOff()) for vm in vms
+                             if vm.power_state != _POWERED_OFF]
+        run_until_complete(power_off_futures)
+        for future in power_off_futures:
+            future.result()
+
+        destroy_futures = [submit(vm.vim_obj.Destroy()) for vm in vms]
+        run_until_complete(destroy_futures)
+        self.invalidate()
+        for future in destroy_futures:
+            future.result()
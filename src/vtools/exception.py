@@ -1,44 +1,82 @@
 import sys
+from functools import wraps
 
 from _socket import gaierror
 from pyVmomi import vim
 from requests.exceptions import MissingSchema, InvalidURL
 
 
-def handle_exceptions():
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            try:
-                return func(*args, **kwargs)
-            except KeyError as e:
-                print(f"Exception occurred: {e}")
-                print("Please set a config file using the command:")
-                print("vtools-cli config set --ip <HostIP> --user <username> --pwd <password>")
-            except ConnectionRefusedError as e:
-                print(f"Exception occurred: {e}")
-                print("Please check if the network connection and if the IP address is valid and try again.")
-            except gaierror as e:
-                print(f"Exception occurred: {e}")
-                print("Please check if the network connection and if the IP address is valid and try again.")
-            except vim.fault.InvalidLogin as e:
-                print(f"Exception occurred: {e.msg}")
-                print("Please set the correct username or password using the command:\n"
-                      "vtools-cli config set --ip <HostIP> --user <username> --pwd <password>")
-            except MissingSchema as e:
-                print(f"Exception occurred: {e}. Please enter a valid url.")
-            except InvalidURL as e:
-                print(f"Exception occurred: {e}. Please enter a valid url.")
-            # except vim.fault.HostConnectFault as e:
-            #     print(f"Exception occurred: {e.msg}")
-            #     print("Please secure internet connection and try again.")
-            # except vim.fault.HostNotConnected as e:
-            #     print(f"Exception occurred: {e}")
-            except Exception as e:
-                print(f"Exception occurred: {e}")
-            sys.exit()
-        return wrapper
-    return decorator
-
-
-class InvalidStateError(RuntimeError):
+def _handle_missing_config(e: KeyError) -> None:
+    print(f"Exception occurred: {e}")
+    print("Please set a config file using the command:")
+    print("vtools-cli config set --ip <HostIP> --user <username> --pwd <password>")
+
+
+def _handle_connection_error(e: Exception) -> None:
+    print(f"Exception occurred: {e}")
+    print("Please check if the network connection and if the IP address is valid and try again.")
+
+
+def _handle_invalid_login(e: vim.fault.InvalidLogin) -> None:
+    print(f"Exception occurred: {e.msg}")
+    print("Please set the correct username or password using the command:\n"
+          "vtools-cli config set --ip <HostIP> --user <username> --pwd <password>")
+
+
+def _handle_invalid_url(e: Exception) -> None:
+    print(f"Exception occurred: {e}. Please enter a valid url.")
+
+
+def _handle_unknown(e: Exception) -> None:
+    print(f"Exception occurred: {e}")
+
+
+_HANDLERS = {
+    KeyError: _handle_missing_config,
+    ConnectionRefusedError: _handle_connection_error,
+    gaierror: _handle_connection_error,
+    vim.fault.InvalidLogin: _handle_invalid_login,
+    MissingSchema: _handle_invalid_url,
+    InvalidURL: _handle_invalid_url,
+}
+
+
+def handle_exceptions(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            for clazz in type(e).__mro__:
+                handler = _HANDLERS.get(clazz)
+                if handler is not None:
+                    break
+            else:
+                handler = _handle_unknown
+            handler(e)
+            sys.exit(1)
+    return wrapper
+
+
+class VToolsError(Exception):
+   pass
+
+
+class InvalidStateError(VToolsError, RuntimeError):
+   pass
+
+
+class VMNotPoweredOffError(InvalidStateError):
+   pass
+
+
+class SnapshotNotFoundError(InvalidStateError):
+   pass
+
+
+class DiskLimitError(InvalidStateError):
+   pass
+
+
+class DeviceOptionNotFoundError(VToolsError, LookupError):
    pass
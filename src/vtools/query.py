@@ -1,5 +1,8 @@
+import time
 from typing import (
     Any,
+    Dict,
+    Iterator,
     List,
     Callable,
     TypeVar,
@@ -23,18 +26,56 @@ def by_name(condition: Callable[[Any], bool]) -> Callable[[T], bool]:
 
 
 class QueryMixin(Generic[T]):
+    __slots__ = ('_cache', '_cache_time', '_names')
+
+    _cache_ttl = 1.0
+
     def list(
         self,
         condition: Callable[[T], bool] = None
     ) -> List[T]:
-        all_items = self._list_all()
+        all_items = self._list_all_cached()
 
         if condition is None:
-            return all_items
+            return list(all_items)
         return [item for item in all_items if condition(item)]
 
     def get(self, condition: Callable[[T], bool]) -> T:
-        for item in self._list_all():
+        items = self._cache if self._is_cache_fresh() else self._iter_all()
+        for item in items:
             if condition(item):
                 return item
         return None
+
+    def get_by_name(self, name: str) -> T:
+        return self._name_index().get(name)
+
+    def invalidate(self) -> None:
+        self._cache_time = None
+
+    def _iter_all(self) -> Iterator[T]:
+        raise NotImplementedError
+
+    def _list_all(self) -> List[T]:
+        return list(self._iter_all())
+
+    def _is_cache_fresh(self) -> bool:
+        cache_time = getattr(self, '_cache_time', None)
+        return (cache_time is not None
+                and time.monotonic() - cache_time < self._cache_ttl)
+
+    def _list_all_cached(self) -> List[T]:
+        if not self._is_cache_fresh():
+            self._cache = self._list_all()
+            self._cache_time = time.monotonic()
+            self._names = None
+        return self._cache
+
+    def _name_index(self) -> Dict[str, T]:
+        all_items = self._list_all_cached()
+        if self._names is None:
+            names = {}
+            for item in all_items:
+                names.setdefault(item.name, item)
+            self._names = names
+        return self._names
@@ -1,50 +1,68 @@
-from enum import Enum
-from typing import List
+from collections import namedtuple
+from typing import (
+    Dict,
+    Iterator,
+    List
+)
 
 from pyVmomi import vim
 
 
+def iter_snapshot_tree(
+    from_list: List[vim.vm.SnapshotTree]
+) -> Iterator[vim.vm.SnapshotTree]:
+    stack = list(reversed(from_list)) if from_list else []
+    while stack:
+        snapshot_tree = stack.pop()
+        yield snapshot_tree
+        if snapshot_tree.childSnapshotList:
+            stack.extend(reversed(snapshot_tree.childSnapshotList))
+
+
 def flatten_snapshot_tree(
     from_list: List[vim.vm.SnapshotTree],
-    to_list: List[vim.vm.SnapshotTree]
-) -> None:
-    if not from_list:
-        return
-
-    for snapshot_tree in from_list:
-        to_list.append(snapshot_tree)
-        flatten_snapshot_tree(snapshot_tree.childSnapshotList, to_list)
+    to_list: List[vim.vm.SnapshotTree] = None
+) -> List[vim.vm.SnapshotTree]:
+    if to_list is None:
+        to_list = []
+    to_list.extend(iter_snapshot_tree(from_list))
+    return to_list
 
 
 def find_snapshot_tree(
     from_list: List[vim.vm.SnapshotTree],
     by_snapshot: vim.vm.Snapshot,
 ) -> vim.vm.SnapshotTree:
-    for snapshot_tree in from_list:
+    for snapshot_tree in iter_snapshot_tree(from_list):
         if snapshot_tree.snapshot == by_snapshot:
             return snapshot_tree
-
-        if snapshot_tree.childSnapshotList:
-            matched_child_snapshot_tree = find_snapshot_tree(
-                snapshot_tree.childSnapshotList,
-                by_snapshot
-            )
-            if matched_child_snapshot_tree is not None:
-                return matched_child_snapshot_tree
     return None
 
 
-class SnapshotType(Enum):
-    SIMPLE = (False, False)
-    QUIESCED = (False, True)
-    MEMORY = (True, False)
+def index_snapshot_trees(
+    from_list: List[vim.vm.SnapshotTree]
+) -> Dict[str, vim.vm.SnapshotTree]:
+    return {snapshot_tree.snapshot._moId: snapshot_tree
+            for snapshot_tree in iter_snapshot_tree(from_list)}
 
-    def __init__(self, is_memory: bool, is_quiesced: bool) -> None:
-        self.is_memory = is_memory
-        self.is_quiesced = is_quiesced
+
+SnapshotFlags = namedtuple('SnapshotFlags', 'is_memory is_quiesced')
+
+SIMPLE = SnapshotFlags(is_memory=False, is_quiesced=False)
+QUIESCED = SnapshotFlags(is_memory=False, is_quiesced=True)
+MEMORY = SnapshotFlags(is_memory=True, is_quiesced=False)
+
+
+class SnapshotType:
+    # Kept for callers written against the former enum
+    SIMPLE = SIMPLE
+    QUIESCED = QUIESCED
+    MEMORY = MEMORY
 
 
 class Snapshot:
+    __slots__ = ('vim_obj', '_snapshot_tree_vim_obj')
+
     def __init__(
         self,
         vim_obj: vim.vm.Snapshot,
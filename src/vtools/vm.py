@@ -1,18 +1,44 @@
 import copy
+import os
+from bisect import insort
+from collections import defaultdict
 from enum import Enum
-from functools import cached_property
-from typing import List
+from functools import (
+    cached_property,
+    reduce
+)
+from itertools import chain
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple
+)
 
 from loguru import logger
-from pyVim.task import WaitForTask
-from pyVmomi import vim
+from pyVmomi import (
+    vim,
+    vmodl
+)
 from tenacity import (
+    Retrying,
     retry,
+    retry_if_exception_type,
     stop_after_attempt,
-    wait_fixed,
-    TryAgain
+    wait_exponential,
+    wait_random
 )
 
+from vtools.async_tasks import (
+    TaskFuture,
+    run_until_complete,
+    submit
+)
 from vtools.datastore import Datastore
 from vtools.device import (
     Controller,
@@ -21,22 +47,122 @@ from vtools.device import (
     ScsiControllerType,
     ScsiBusSharingType
 )
-from vtools.exception import InvalidStateError
+from vtools.exception import (
+    DiskLimitError,
+    InvalidStateError,
+    SnapshotNotFoundError,
+    VMNotPoweredOffError
+)
 from vtools.query import QueryMixin
 from vtools.snapshot import (
+    SIMPLE,
     Snapshot,
-    SnapshotType,
-    flatten_snapshot_tree,
-    find_snapshot_tree
+    SnapshotFlags,
+    index_snapshot_trees,
+    iter_snapshot_tree
 )
 from vtools.vsphere import (
-    get_first_vim_obj,
     create_http_nfc_lease,
-    deploy_vm_with_pull_mode,
+    pull_from_urls,
+    push_to_urls,
     create_import_spec,
-    find_device_option_by_type
+    get_device_option_or_raise,
+    invalidate_network_cache,
+    retrieve_properties,
+    wait_for_updates,
+    wait_for_task
 )
 
+_POWERED_ON = vim.VirtualMachine.PowerState.poweredOn
+_POWERED_OFF = vim.VirtualMachine.PowerState.poweredOff
+_SUSPENDED = vim.VirtualMachine.PowerState.suspended
+
+_OPERATION_ADD = vim.vm.device.VirtualDeviceSpec.Operation.add
+_OPERATION_REMOVE = vim.vm.device.VirtualDeviceSpec.Operation.remove
+_FILE_OPERATION_CREATE = vim.vm.device.VirtualDeviceSpec.FileOperation.create
+_KB_PER_MB = 1024
+
+_VIRTUAL_DISK = vim.vm.device.VirtualDisk
+_VIRTUAL_SCSI_CONTROLLER = vim.vm.device.VirtualSCSIController
+_FILE_BACKING_INFO = vim.vm.device.VirtualDevice.FileBackingInfo
+
+_POWER_STATE_PATH = 'summary.runtime.powerState'
+_DEVICES_PATH = 'config.hardware.device'
+_ROOT_SNAPSHOT_LIST_PATH = 'snapshot.rootSnapshotList'
+_GUEST_NET_PATH = 'guest.net'
+_POWER_STATE_TIMEOUT_IN_SECONDS = 600
+_POWER_TASK_MAX_ATTEMPTS = 6
+_POWER_TASK_BACKOFF_MULTIPLIER = 0.25
+_POWER_TASK_MAX_BACKOFF_IN_SECONDS = 5
+_POWER_TASK_MAX_JITTER_IN_SECONDS = 0.25
+
+PREFETCHED_PROPERTY_PATHS = (
+    'summary.config.name',
+    'summary.config.vmPathName',
+    _POWER_STATE_PATH,
+    'config.version',
+    'config.hardware.numCPU',
+    'config.hardware.numCoresPerSocket',
+    'config.hardware.memoryMB',
+    'guest.ipAddress',
+    'runtime.host',
+)
+
+
+POWER_TASK_RETRY_KWARGS = dict(
+    stop=stop_after_attempt(_POWER_TASK_MAX_ATTEMPTS),
+    wait=(wait_exponential(multiplier=_POWER_TASK_BACKOFF_MULTIPLIER,
+                           max=_POWER_TASK_MAX_BACKOFF_IN_SECONDS)
+          + wait_random(0, _POWER_TASK_MAX_JITTER_IN_SECONDS)),
+    retry=retry_if_exception_type(vim.fault.TaskInProgress),
+    reraise=True
+)
+
+
+@retry(**POWER_TASK_RETRY_KWARGS)
+def _run_power_task(start_task: Callable[[], vim.Task]) -> None:
+    wait_for_task(start_task())
+
+
+def run_power_tasks(
+    vms: List['VM'],
+    start_task: Callable[['VM'], vim.Task],
+    target_state: vim.VirtualMachine.PowerState
+) -> None:
+    pending_vms = list(vms)
+    for attempt in Retrying(**POWER_TASK_RETRY_KWARGS):
+        with attempt:
+            futures = [submit(start_task(vm)) for vm in pending_vms]
+            run_until_complete(futures)
+
+            busy_vms = []
+            for vm, future in zip(pending_vms, futures):
+                vm.invalidate()
+                try:
+                    future.result()
+                except vim.fault.TaskInProgress:
+                    busy_vms.append(vm)
+                except vim.fault.InvalidPowerState as e:
+                    if not is_already_in_power_state(e, target_state):
+                        raise
+                    logger.warning(
+                        f"{vm!r} was already in the requested power state"
+                    )
+
+            # Only VMs that were busy with another task are started again
+            pending_vms = busy_vms
+            if pending_vms:
+                raise vim.fault.TaskInProgress()
+
+
+def is_already_in_power_state(
+    fault: vim.fault.InvalidPowerState,
+    target_state: vim.VirtualMachine.PowerState
+) -> bool:
+    # InvalidPowerState is also raised for impossible transitions, e.g.
+    # suspending a powered off VM, which must not be treated as done
+    return fault.existingState == target_state
+
 
 class FirmwareType(Enum):
     BIOS = (vim.vm.GuestOsDescriptor.FirmwareType.bios)
@@ -47,44 +173,96 @@ class FirmwareType(Enum):
 
 
 class VM:
-    def __init__(self, vim_obj: vim.VirtualMachine) -> None:
+    __slots__ = ('vim_obj', '_props', '__dict__')
+
+    def __init__(
+        self,
+        vim_obj: vim.VirtualMachine,
+        props: Dict[str, Any] = None,
+        esxi: 'ESXi' = None
+    ) -> None:
         self.vim_obj = vim_obj
+        self._props = props if props is not None else {}
+        if esxi is not None:
+            # Share the caller's connection instead of one ESXi per VM
+            self.__dict__['esxi'] = esxi
 
     def __repr__(self) -> str:
         return f'VM(vim_obj={self.vim_obj!r})'
 
+    @classmethod
+    def hydrate(
+        cls,
+        vms: Sequence['VM'],
+        path_set: Sequence[str] = PREFETCHED_PROPERTY_PATHS,
+        esxi: 'ESXi' = None
+    ) -> None:
+        if not vms:
+            return
+
+        vms_by_vim_obj = defaultdict(list)
+        for vm in vms:
+            if esxi is not None:
+                vm.__dict__.setdefault('esxi', esxi)
+            vms_by_vim_obj[vm.vim_obj].append(vm)
+        object_specs = [
+            vmodl.query.PropertyCollector.ObjectSpec(obj=vim_obj)
+            for vim_obj in vms_by_vim_obj
+        ]
+        content = (esxi or vms[0].esxi)._content
+        for vim_obj, props in retrieve_properties(content,
+                                                  object_specs,
+                                                  vim.VirtualMachine,
+                                                  path_set):
+            for vm in vms_by_vim_obj[vim_obj]:
+                vm._props.update(props)
+                vm.__dict__.pop('ips', None)
+
     @property
     def name(self) -> str:
-        return self.vim_obj.summary.config.name
+        return self._get_property('summary.config.name')
 
     @property
     def primary_ip(self) -> str:
-        return self.vim_obj.guest.ipAddress
+        return self._get_property('guest.ipAddress')
 
-    @property
+    @cached_property
     def ips(self) -> List[str]:
+        # guest.ipAddress is prefetched; fetch only guest.net, not all of guest
+        if _GUEST_NET_PATH in self._props:
+            nic_infos = self._props[_GUEST_NET_PATH]
+        else:
+            nic_infos = self._retrieve([_GUEST_NET_PATH]).get(_GUEST_NET_PATH)
+        nic_infos = nic_infos or []
         return [
             nic_ip.ipAddress
-            for nic_info in self.vim_obj.guest.net
-            for nic_ip in nic_info.ipConfig.ipAddress
+            for nic_ip in chain.from_iterable(
+                nic_info.ipConfig.ipAddress for nic_info in nic_infos
+                if nic_info.ipConfig is not None
+            )
         ]
 
     @property
     def path(self) -> str:
-        return self.vim_obj.summary.config.vmPathName
+        return self._get_property('summary.config.vmPathName')
 
     @property
     def power_state(self) -> vim.VirtualMachine.PowerState:
-        return self.vim_obj.summary.runtime.powerState
+        return self._get_property(_POWER_STATE_PATH)
 
-    @property
+    @cached_property
     def hardware_version(self) -> str:
-        return self.vim_obj.config.version
+        return self._get_property('config.version')
 
-    @property
+    @cached_property
     def esxi(self) -> 'ESXi':
+        # vtools.esxi imports this module, so ESXi can't be imported at the top
         from vtools.esxi import ESXi
-        return ESXi(vim_obj=self.vim_obj.runtime.host)
+        host_vim_obj = self._props.get('runtime.host')
+        if host_vim_obj is None:
+            # Not through _get_property: refresh() itself needs self.esxi
+            host_vim_obj = self.vim_obj.runtime.host
+        return ESXi(vim_obj=host_vim_obj)
 
     @cached_property
     def config_option(self) -> vim.vm.ConfigOption:
@@ -110,222 +288,353 @@ class VM:
     def snapshots(self) -> 'SnapshotManager':
         return SnapshotManager(self)
 
+    @cached_property
+    def _devices(self) -> List[vim.vm.device.VirtualDevice]:
+        # Only the device list, not the whole VirtualMachineConfigInfo
+        props = self._retrieve([_DEVICES_PATH])
+        return list(props.get(_DEVICES_PATH) or [])
+
+    @cached_property
+    def _devices_by_type(
+        self
+    ) -> Dict[type, List[vim.vm.device.VirtualDevice]]:
+        devices_by_type = defaultdict(list)
+        for device_vim_obj in self._devices:
+            devices_by_type[type(device_vim_obj)].append(device_vim_obj)
+        return devices_by_type
+
+    @cached_property
+    def _units_by_controller(self) -> Dict[int, List[int]]:
+        units_by_controller = defaultdict(list)
+        for device_vim_obj in self._devices:
+            if device_vim_obj.controllerKey is not None:
+                units_by_controller[device_vim_obj.controllerKey].append(
+                    device_vim_obj.unitNumber
+                )
+        return units_by_controller
+
+    def invalidate(self) -> None:
+        self._invalidate_properties()
+        self._invalidate_devices()
+
+    def _invalidate_properties(self) -> None:
+        self._props = {}
+        self.__dict__.pop('ips', None)
+
+    def _invalidate_devices(self) -> None:
+        self.__dict__.pop('_devices', None)
+        self.__dict__.pop('_devices_by_type', None)
+        self.__dict__.pop('_units_by_controller', None)
+
+    def _iter_devices_of_type(
+        self,
+        vim_class: type
+    ) -> Iterator[vim.vm.device.VirtualDevice]:
+        for device_class, device_vim_objs in self._devices_by_type.items():
+            if issubclass(device_class, vim_class):
+                yield from device_vim_objs
+
     def power_on(self) -> None:
+        self._invalidate_properties()
         self._invoke_power_on()
-        self._wait_until_power_state_is(vim.VirtualMachine.PowerState.poweredOn)
+        self._wait_until_power_state_is(_POWERED_ON)
 
     def power_off(self) -> None:
+        self._invalidate_properties()
         self._invoke_power_off()
-        self._wait_until_power_state_is(
-            vim.VirtualMachine.PowerState.poweredOff)
+        self._wait_until_power_state_is(_POWERED_OFF)
 
     def suspend(self) -> None:
+        self._invalidate_properties()
         self._invoke_suspend()
-        self._wait_until_power_state_is(vim.VirtualMachine.PowerState.suspended)
+        self._wait_until_power_state_is(_SUSPENDED)
+
+    def reconfigure(
+        self,
+        cpu_number: int = None,
+        cpu_cores_per_socket: int = None,
+        memory_size_in_mb: int = None,
+        device_changes: List[vim.vm.device.VirtualDeviceSpec] = None
+    ) -> None:
+        config_spec = vim.vm.ConfigSpec()
+        if cpu_number is not None:
+            config_spec.numCPUs = cpu_number
+        if cpu_cores_per_socket is not None:
+            config_spec.numCoresPerSocket = cpu_cores_per_socket
+        if memory_size_in_mb is not None:
+            config_spec.memoryMB = memory_size_in_mb
+
+        hardware_changed = (cpu_number, cpu_cores_per_socket,
+                            memory_size_in_mb) != (None, None, None)
+        if hardware_changed and self._current_power_state() != _POWERED_OFF:
+            raise VMNotPoweredOffError(
+                f'{self!r} must be powered off to change CPU or memory'
+            )
+
+        if device_changes:
+            config_spec.deviceChange = device_changes
+
+        wait_for_task(self.vim_obj.Reconfigure(config_spec))
+        self.invalidate()
+        if device_changes:
+            self.scsi_controllers.invalidate()
+            self.disks.invalidate()
+
+    def _current_power_state(self) -> vim.VirtualMachine.PowerState:
+        # The prefetched value may predate a power operation made elsewhere
+        power_state = self._retrieve([_POWER_STATE_PATH]).get(
+            _POWER_STATE_PATH
+        )
+        if self._props:
+            self._props[_POWER_STATE_PATH] = power_state
+        return power_state
 
     def revert_to_snapshot(self, snapshot: Snapshot) -> None:
+        if snapshot is None:
+            raise SnapshotNotFoundError()
         if snapshot.vim_obj.vm != self.vim_obj:
             raise InvalidStateError()
 
-        WaitForTask(snapshot.vim_obj.Revert(suppressPowerOn=False))
+        wait_for_task(snapshot.vim_obj.Revert(suppressPowerOn=False))
+        self.invalidate()
+        self.snapshots.invalidate()
+
+    def refresh(self) -> None:
+        self._props = self._retrieve(PREFETCHED_PROPERTY_PATHS)
+        self.__dict__.pop('ips', None)
+
+    def _retrieve(self, path_set: Sequence[str]) -> Dict[str, Any]:
+        object_spec = vmodl.query.PropertyCollector.ObjectSpec(
+            obj=self.vim_obj
+        )
+        for _, props in retrieve_properties(self.esxi._content,
+                                            [object_spec],
+                                            vim.VirtualMachine,
+                                            path_set):
+            return props
+        return {}
+
+    def _get_property(self, path: str) -> Any:
+        if not self._props and path in PREFETCHED_PROPERTY_PATHS:
+            self.refresh()
+        try:
+            return self._props[path]
+        except KeyError:
+            return reduce(getattr, path.split('.'), self.vim_obj)
 
-    @retry(stop=stop_after_attempt(12),
-           wait=wait_fixed(5))
     def _invoke_power_on(self) -> None:
-        if self.power_state == vim.VirtualMachine.PowerState.poweredOn:
-            logger.warning(
-                "PowerState was already PoweredOn, no need to power on"
-            )
-            return
-        WaitForTask(self.vim_obj.PowerOn())
+        self._invoke_power_task(
+            self.vim_obj.PowerOn,
+            _POWERED_ON,
+            "PowerState was already PoweredOn, no need to power on"
+        )
 
-    @retry(stop=stop_after_attempt(12),
-           wait=wait_fixed(5))
     def _invoke_power_off(self) -> None:
-        if self.power_state == vim.VirtualMachine.PowerState.poweredOff:
-            logger.warning(
-                "PowerState was already PoweredOff, no need to power off"
-            )
-            return
-        WaitForTask(self.vim_obj.PowerOff())
+        self._invoke_power_task(
+            self.vim_obj.PowerOff,
+            _POWERED_OFF,
+            "PowerState was already PoweredOff, no need to power off"
+        )
 
-    @retry(stop=stop_after_attempt(12),
-           wait=wait_fixed(5))
     def _invoke_suspend(self) -> None:
-        if self.power_state == vim.VirtualMachine.PowerState.suspended:
-            logger.warning(
-                "PowerState was already Suspended, no need to suspend"
-            )
-            return
-        WaitForTask(self.vim_obj.Suspend())
+        self._invoke_power_task(
+            self.vim_obj.Suspend,
+            _SUSPENDED,
+            "PowerState was already Suspended, no need to suspend"
+        )
+
+    def _invoke_power_task(
+        self,
+        start_task: Callable[[], vim.Task],
+        target_state: vim.VirtualMachine.PowerState,
+        already_in_state_message: str
+    ) -> None:
+        try:
+            _run_power_task(start_task)
+        except vim.fault.InvalidPowerState as e:
+            if not is_already_in_power_state(e, target_state):
+                raise
+            logger.warning(already_in_state_message)
 
-    @retry(stop=stop_after_attempt(60),
-           wait=wait_fixed(10))
     def _wait_until_power_state_is(
         self,
         expected_state: vim.VirtualMachine.PowerState
     ) -> None:
-        current_power_state = self.power_state
-        if current_power_state != expected_state:
-            logger.warning(f"PowerStatus was still not {expected_state}: "
-                           f"{current_power_state}")
-            raise TryAgain
-        else:
-            logger.info(f"PowerStatus was {expected_state}")
+        wait_for_updates(
+            self.vim_obj,
+            [_POWER_STATE_PATH],
+            lambda props: props.get(_POWER_STATE_PATH) == expected_state,
+            timeout=_POWER_STATE_TIMEOUT_IN_SECONDS
+        )
+        self._invalidate_properties()
+        logger.info(f"PowerStatus was {expected_state}")
 
 
 class CpuManager:
+    __slots__ = ('vm',)
+
     def __init__(self, vm: VM) -> None:
         self.vm = vm
 
     @property
     def number(self) -> int:
-        return self.vm.vim_obj.config.hardware.numCPU
+        return self.vm._get_property('config.hardware.numCPU')
 
     @number.setter
     def number(self, value) -> None:
-        if self.vm.power_state != vim.VirtualMachine.PowerState.poweredOff:
-            raise InvalidStateError()
-
-        config_spec = vim.vm.ConfigSpec()
-        config_spec.numCPUs = value
-
-        WaitForTask(self.vm.vim_obj.Reconfigure(config_spec))
+        self.vm.reconfigure(cpu_number=value)
 
     @property
     def cores_per_socket(self) -> int:
-        return self.vm.vim_obj.config.hardware.numCoresPerSocket
+        return self.vm._get_property('config.hardware.numCoresPerSocket')
 
     @cores_per_socket.setter
     def cores_per_socket(self, value) -> None:
-        if self.vm.power_state != vim.VirtualMachine.PowerState.poweredOff:
-            raise InvalidStateError()
-
-        config_spec = vim.vm.ConfigSpec()
-        config_spec.numCoresPerSocket = value
-
-        WaitForTask(self.vm.vim_obj.Reconfigure(config_spec))
+        self.vm.reconfigure(cpu_cores_per_socket=value)
 
 
 class MemoryManager:
+    __slots__ = ('vm',)
+
     def __init__(self, vm: VM) -> None:
         self.vm = vm
 
     @property
     def size_in_mb(self) -> int:
-        return self.vm.vim_obj.config.hardware.memoryMB
+        return self.vm._get_property('config.hardware.memoryMB')
 
     @size_in_mb.setter
     def size_in_mb(self, value) -> None:
-        if self.vm.power_state != vim.VirtualMachine.PowerState.poweredOff:
-            raise InvalidStateError()
-
-        config_spec = vim.vm.ConfigSpec()
-        config_spec.memoryMB = value
-
-        WaitForTask(self.vm.vim_obj.Reconfigure(config_spec))
+        self.vm.reconfigure(memory_size_in_mb=value)
 
 
 class ScsiControllerManager(QueryMixin[Controller]):
+    __slots__ = ('vm',)
+
     def __init__(self, vm: VM) -> None:
         self.vm = vm
 
-    def _list_all(self) -> List[Controller]:
-        return [Controller(device_vim_obj, self.vm) for device_vim_obj
-                in self.vm.vim_obj.config.hardware.device
-                if
-                isinstance(device_vim_obj, vim.vm.device.VirtualSCSIController)]
+    def _iter_all(self) -> Iterator[Controller]:
+        for device_vim_obj in self.vm._iter_devices_of_type(
+            _VIRTUAL_SCSI_CONTROLLER
+        ):
+            yield Controller(device_vim_obj, self.vm)
+
+    @property
+    def default(self) -> Optional[Controller]:
+        controllers = self._list_all_cached()
+        return controllers[0] if controllers else None
 
-    def add(self, spec: ScsiControllerCreateSpec) -> None:
-        existing_controllers = self.list()
+    def add(self, spec: ScsiControllerCreateSpec) -> Controller:
+        existing_keys = {controller.key for controller in self.list()}
 
-        new_controller_spec = spec.vim_device_spec
+        # A fresh spec, so the cached vim_device_spec is never mutated
+        new_controller_spec = spec.build()
         new_controller_spec.device.key = -1
-        new_controller_spec.device.busNumber = len(existing_controllers)
+        new_controller_spec.device.busNumber = len(existing_keys)
 
-        config_spec = vim.vm.ConfigSpec()
-        config_spec.deviceChange = [new_controller_spec]
+        self.vm.reconfigure(device_changes=[new_controller_spec])
+
+        return self.get(lambda controller: controller.key not in existing_keys)
 
-        WaitForTask(self.vm.vim_obj.Reconfigure(config_spec))
+    def remove(self, controller: Controller) -> None:
+        remove_controller_spec = vim.vm.device.VirtualDeviceSpec()
+        remove_controller_spec.operation = _OPERATION_REMOVE
+        remove_controller_spec.device = controller.vim_obj
 
-        new_controllers = [controller for controller in self.list()
-                           if controller not in existing_controllers]
-        return new_controllers[0]
+        self.vm.reconfigure(device_changes=[remove_controller_spec])
 
 
 class DiskManager(QueryMixin[Disk]):
+    __slots__ = ('vm',)
+
     def __init__(self, vm: VM) -> None:
         self.vm = vm
 
-    def _list_all(self) -> List[Disk]:
-        return [Disk(device_vim_obj, self.vm) for device_vim_obj
-                in self.vm.vim_obj.config.hardware.device
-                if isinstance(device_vim_obj, vim.vm.device.VirtualDisk)]
+    def _iter_all(self) -> Iterator[Disk]:
+        for device_vim_obj in self.vm._iter_devices_of_type(_VIRTUAL_DISK):
+            yield Disk(device_vim_obj, self.vm)
 
     def add(
         self,
         size_in_mb: int,
         backing: vim.vm.device.VirtualDevice.FileBackingInfo,
-        controller: Controller
+        controller: Controller = None
     ) -> Disk:
-        existing_disks = self.list()
+        return self.add_many([(size_in_mb, backing, controller)])[0]
 
-        new_disk = vim.vm.device.VirtualDisk()
-        new_disk.key = -1
-        new_disk.controllerKey = controller.key
-        new_disk.unitNumber = controller.next_free_unit
-        new_disk.backing = backing
-        new_disk.capacityInKB = size_in_mb * 1024
+    def add_many(
+        self,
+        disks: List[Tuple[int,
+                          vim.vm.device.VirtualDevice.FileBackingInfo,
+                          Optional[Controller]]]
+    ) -> List[Disk]:
+        if not disks:
+            return []
 
-        new_disk_spec = vim.vm.device.VirtualDeviceSpec()
-        new_disk_spec.operation = (
-            vim.vm.device.VirtualDeviceSpec.Operation.add
-        )
-        new_disk_spec.fileOperation = (
-            vim.vm.device.VirtualDeviceSpec.FileOperation.create
-        )
+        existing_keys = {disk.key for disk in self.list()}
 
-        new_disk_spec.device = new_disk
+        reserved_units = defaultdict(list)
+        new_disk_specs = []
+        for index, (size_in_mb, backing, controller) in enumerate(disks):
+            if controller is None:
+                controller = self.vm.scsi_controllers.default
+                if controller is None:
+                    raise InvalidStateError(
+                        f'{self.vm!r} has no SCSI controller'
+                    )
 
-        config_spec = vim.vm.ConfigSpec()
-        config_spec.deviceChange = [new_disk_spec]
+            unit_number = controller.find_free_unit(
+                reserved_units[controller.key]
+            )
+            if unit_number is None:
+                raise DiskLimitError(f'{controller!r} has no free unit')
+            reserved_units[controller.key].append(unit_number)
+
+            new_disk = vim.vm.device.VirtualDisk()
+            new_disk.key = -(index + 1)
+            new_disk.controllerKey = controller.key
+            new_disk.unitNumber = unit_number
+            new_disk.backing = backing
+            new_disk.capacityInKB = size_in_mb * _KB_PER_MB
+
+            new_disk_spec = vim.vm.device.VirtualDeviceSpec()
+            new_disk_spec.operation = _OPERATION_ADD
+            new_disk_spec.fileOperation = _FILE_OPERATION_CREATE
 
-        WaitForTask(self.vm.vim_obj.Reconfigure(config_spec))
+            new_disk_spec.device = new_disk
+            new_disk_specs.append(new_disk_spec)
 
-        new_disks = [disk for disk in self.list() if disk not in existing_disks]
-        return new_disks[0]
+        self.vm.reconfigure(device_changes=new_disk_specs)
+
+        return self.list(lambda disk: disk.key not in existing_keys)
 
     def remove(self, disk: Disk) -> None:
         remove_disk_spec = vim.vm.device.VirtualDeviceSpec()
-        remove_disk_spec.operation = vim.vm.device.VirtualDeviceSpec.Operation.remove
+        remove_disk_spec.operation = _OPERATION_REMOVE
         remove_disk_spec.device = disk.vim_obj
 
-        config_spec = vim.vm.ConfigSpec()
-        config_spec.deviceChange = [remove_disk_spec]
-
-        WaitForTask(self.vm.vim_obj.Reconfigure(config_spec))
+        self.vm.reconfigure(device_changes=[remove_disk_spec])
 
 
 class SnapshotManager(QueryMixin[Snapshot]):
+    __slots__ = ('vm',)
+
     def __init__(self, vm: VM) -> None:
         self.vm = vm
 
-    def _list_all(self) -> List[Snapshot]:
-        snapshot_info = self.vm.vim_obj.snapshot
-        if snapshot_info is None:
-            return []
-
-        snapshot_tree_list = []
-        flatten_snapshot_tree(snapshot_info.rootSnapshotList,
-                              snapshot_tree_list)
+    def _iter_all(self) -> Iterator[Snapshot]:
+        for snapshot_tree in iter_snapshot_tree(self._root_snapshot_list()):
+            yield Snapshot(snapshot_tree.snapshot, snapshot_tree)
 
-        return [Snapshot(snapshot_tree.snapshot, snapshot_tree)
-                for snapshot_tree in snapshot_tree_list]
+    def _root_snapshot_list(self) -> List[vim.vm.SnapshotTree]:
+        props = self.vm._retrieve([_ROOT_SNAPSHOT_LIST_PATH])
+        return props.get(_ROOT_SNAPSHOT_LIST_PATH) or []
 
     def create(
         self,
         name: str,
-        snapshot_type: SnapshotType = SnapshotType.SIMPLE,
+        snapshot_type: SnapshotFlags = SIMPLE,
         description: str = None
     ) -> Snapshot:
         task = self.vm.vim_obj.CreateSnapshot(
@@ -333,22 +642,42 @@ class SnapshotManager(QueryMixin[Snapshot]):
             snapshot_type.is_memory,
             snapshot_type.is_quiesced
         )
-        WaitForTask(task)
+        wait_for_task(task)
+        self.invalidate()
         new_snapshot_vim_obj = task.info.result
-        new_snapshot_tree_vim_obj = find_snapshot_tree(
-            self.vm.vim_obj.snapshot.rootSnapshotList,
-            new_snapshot_vim_obj
-        )
+        new_snapshot_tree_vim_obj = index_snapshot_trees(
+            self._root_snapshot_list()
+        )[new_snapshot_vim_obj._moId]
         return Snapshot(new_snapshot_vim_obj, new_snapshot_tree_vim_obj)
 
     def delete(self, snapshot: Snapshot) -> None:
+        if snapshot is None:
+            raise SnapshotNotFoundError()
         if snapshot.vim_obj.vm != self.vm.vim_obj:
             raise InvalidStateError()
 
-        WaitForTask(snapshot.vim_obj.Remove(False))
+        wait_for_task(snapshot.vim_obj.Remove(False))
+        self.invalidate()
+
+
+def _clone_device_spec(
+    device_spec: vim.vm.device.VirtualDeviceSpec
+) -> vim.vm.device.VirtualDeviceSpec:
+    new_device_spec = vim.vm.device.VirtualDeviceSpec()
+    new_device_spec.operation = device_spec.operation
+    new_device_spec.fileOperation = device_spec.fileOperation
+    new_device_spec.device = device_spec.device
+    return new_device_spec
 
 
 class CreateVMSpec:
+    __slots__ = ('config_option', 'firmware',
+                 'cpu_count', 'cpu_cores_per_socket',
+                 'cpu_hot_add_enabled', 'cpu_hot_remove_enabled',
+                 'memory_size_in_mb', 'memory_hot_add_enabled',
+                 'guest_id', 'devices',
+                 '_last_used_key', '_last_used_scsi_bus', '_used_units')
+
     def __init__(self, config_option: vim.vm.ConfigOption) -> None:
         self.config_option = config_option
 
@@ -367,6 +696,7 @@ class CreateVMSpec:
         self.devices = []
         self._last_used_key = 0
         self._last_used_scsi_bus = 0
+        self._used_units = defaultdict(list)
 
     @property
     def vim_config_spec(self) -> vim.vm.ConfigSpec:
@@ -383,7 +713,8 @@ class CreateVMSpec:
 
         spec.version = self.config_option.version
 
-        spec.deviceChange = copy.deepcopy(self.devices)
+        spec.deviceChange = [_clone_device_spec(device_spec)
+                             for device_spec in self.devices]
 
         return spec
 
@@ -433,21 +764,34 @@ class CreateVMSpec:
         backing: vim.vm.device.VirtualDevice.BackingInfo,
         controller: vim.vm.device.VirtualController
     ) -> vim.vm.device.VirtualDisk:
+        unit_number = self._get_next_free_unit(controller)
+        if unit_number is None:
+            raise DiskLimitError(f'{controller!r} has no free unit')
+
         new_disk = vim.vm.device.VirtualDisk()
         new_disk.key = self._get_next_free_key()
         new_disk.controllerKey = controller.key
-        new_disk.unitNumber = self._get_next_free_unit(controller)
+        new_disk.unitNumber = unit_number
         new_disk.backing = backing
-        new_disk.capacityInKB = size_in_mb * 1024
+        new_disk.capacityInKB = size_in_mb * _KB_PER_MB
 
         self._add_device(new_disk)
 
         return new_disk
 
     def create_vm(self, name: str, esxi: 'ESXi', datastore: Datastore) -> VM:
-        resource_pool_vim_obj = esxi.vim_obj.parent.resourcePool
-        datacenter_vim_obj = get_first_vim_obj(esxi._content, vim.Datacenter)
-        vm_folder_vim_obj = datacenter_vim_obj.vmFolder
+        future = self.submit_create_vm(name, esxi, datastore)
+        run_until_complete([future])
+        return future.result()
+
+    def submit_create_vm(
+        self,
+        name: str,
+        esxi: 'ESXi',
+        datastore: Datastore
+    ) -> TaskFuture:
+        resource_pool_vim_obj = esxi.resource_pool
+        vm_folder_vim_obj = esxi.vm_folder
 
         config_spec = self.vim_config_spec
         config_spec.name = name
@@ -461,43 +805,36 @@ class CreateVMSpec:
             if (
                 device_backing is not None
                 and
-                isinstance(
-                    device_backing,
-                    vim.vm.device.VirtualDevice.FileBackingInfo
-                )
+                isinstance(device_backing, _FILE_BACKING_INFO)
             ):
                 if (
                     not device_backing.fileName
                     or
                     device_backing.fileName.isspace()
                 ):
-                    device_backing.fileName = f"[{datastore.name}]"
+                    # The device is shared with self.devices, so copy it
+                    # before rewriting the backing file name.
+                    one_change.device = copy.deepcopy(one_change.device)
+                    one_change.device.backing.fileName = f"[{datastore.name}]"
 
         task = vm_folder_vim_obj.CreateVm(config_spec, resource_pool_vim_obj,
                                           esxi.vim_obj)
-        WaitForTask(task)
-        return VM(task.info.result)
+        return submit(task, lambda result: VM(result, esxi=esxi))
 
     def _add_device(self, device: vim.vm.device.VirtualDevice) -> None:
         new_device_spec = vim.vm.device.VirtualDeviceSpec()
-        new_device_spec.operation = (
-            vim.vm.device.VirtualDeviceSpec.Operation.add
-        )
+        new_device_spec.operation = _OPERATION_ADD
 
         if (
             device.backing is not None
             and
-            isinstance(
-                device.backing,
-                vim.vm.device.VirtualDevice.FileBackingInfo
-            )
+            isinstance(device.backing, _FILE_BACKING_INFO)
         ):
-            new_device_spec.fileOperation = (
-                vim.vm.device.VirtualDeviceSpec.FileOperation.create
-            )
+            new_device_spec.fileOperation = _FILE_OPERATION_CREATE
 
         new_device_spec.device = device
         self.devices.append(new_device_spec)
+        self._record_used_unit(device)
 
     def _get_next_free_key(self) -> int:
         self._last_used_key = self._last_used_key - 1
@@ -510,62 +847,61 @@ class CreateVMSpec:
     def _find_device_option(self, device_type):
         self.config_option
 
-    def _get_used_units(
-        self,
-        controller: vim.vm.device.VirtualController
-    ) -> List[int]:
-        used_units = []
-        for device_spec in self.devices:
-            device = device_spec.device
-            if (isinstance(device, vim.vm.device.VirtualSCSIController) and
-                device.key == controller.key):
-                if device.scsiCtlrUnitNumber is not None:
-                    used_units.append(device.scsiCtlrUnitNumber)
-                else:
-                    scsi_controller_option = find_device_option_by_type(
-                        self.config_option,
-                        type(controller)
-                    )
-                    used_units.append(
-                        scsi_controller_option.scsiCtlrUnitNumber
-                    )
-                continue
-            if device.controllerKey != controller.key:
-                continue
-            used_units.append(device.unitNumber)
-        return used_units
+    def _record_used_unit(self, device: vim.vm.device.VirtualDevice) -> None:
+        if isinstance(device, _VIRTUAL_SCSI_CONTROLLER):
+            unit_number = device.scsiCtlrUnitNumber
+            if unit_number is None:
+                unit_number = get_device_option_or_raise(
+                    self.config_option,
+                    type(device)
+                ).scsiCtlrUnitNumber
+            insort(self._used_units[device.key], unit_number)
+        elif device.controllerKey is not None:
+            insort(self._used_units[device.controllerKey], device.unitNumber)
 
     def _get_next_free_unit(
         self,
         controller: vim.vm.device.VirtualController
     ) -> int:
-        device_option = find_device_option_by_type(
+        device_option = get_device_option_or_raise(
             self.config_option, type(controller)
         )
         max_devices = device_option.devices.max
-        used_units = self._get_used_units(controller)
+        used_units = self._used_units[controller.key]
         if len(used_units) >= max_devices:
             return None
 
-        used_units.sort()
-        last_index = len(used_units) - 1
-        if used_units[last_index] == last_index:
-            return last_index + 1
-
-        index = 0
-        while used_units[index] == index:
-            index = index + 1
-        return index
+        for index, unit_number in enumerate(used_units):
+            if unit_number != index:
+                return index
+        return len(used_units)
 
 
 class OvfImportSpec:
-    def __init__(self, ovf_url: str) -> None:
+    __slots__ = ('ovf_url', 'push_mode', 'ssl_thumbprints')
+
+    def __init__(
+        self,
+        ovf_url: str,
+        ssl_thumbprints: Mapping[str, str] = None
+    ) -> None:
         self.ovf_url = ovf_url
+        self.push_mode = os.path.isfile(ovf_url)
+        self.ssl_thumbprints = ssl_thumbprints
 
     def create_vm(self, name: str, esxi: 'ESXi', datastore: Datastore) -> VM:
-        resource_pool_vim_obj = esxi.vim_obj.parent.resourcePool
-        datacenter_vim_obj = get_first_vim_obj(esxi._content, vim.Datacenter)
-        vm_folder_vim_obj = datacenter_vim_obj.vmFolder
+        future = self.submit_create_vm(name, esxi, datastore)
+        run_until_complete([future])
+        return future.result()
+
+    def submit_create_vm(
+        self,
+        name: str,
+        esxi: 'ESXi',
+        datastore: Datastore
+    ) -> TaskFuture:
+        resource_pool_vim_obj = esxi.resource_pool
+        vm_folder_vim_obj = esxi.vm_folder
 
         create_result = create_import_spec(content=esxi._content,
                                            ovf_url=self.ovf_url,
@@ -573,20 +909,42 @@ class OvfImportSpec:
                                            datastore_vim_obj=datastore.vim_obj,
                                            vm_name=name)
 
-        http_nfc_lease = create_http_nfc_lease(
-            resource_pool_vim_obj=resource_pool_vim_obj,
-            spec_vim_obj=create_result.importSpec,
-            folder_vim_obj=vm_folder_vim_obj)
-
-        task = deploy_vm_with_pull_mode(self.ovf_url, create_result,
-                                        http_nfc_lease)
-        http_nfc_lease.Complete()
-        return VM(task.info.result)
+        try:
+            http_nfc_lease = create_http_nfc_lease(
+                resource_pool_vim_obj=resource_pool_vim_obj,
+                spec_vim_obj=create_result.importSpec,
+                folder_vim_obj=vm_folder_vim_obj)
+        except Exception:
+            # The cached network may have gone away since it was resolved
+            invalidate_network_cache()
+            raise
+
+        def complete_lease(result) -> VM:
+            http_nfc_lease.Complete()
+            return VM(result, esxi=esxi)
+
+        if self.push_mode:
+            try:
+                push_to_urls(self.ovf_url, create_result, http_nfc_lease,
+                             esxi.ip or esxi.vim_obj.name)
+            except Exception:
+                http_nfc_lease.Abort()
+                raise
+            future = TaskFuture(None)
+            future.set_result(complete_lease(http_nfc_lease.info.entity))
+            return future
+
+        task = pull_from_urls(self.ovf_url, create_result, http_nfc_lease,
+                              self.ssl_thumbprints)
+        return submit(task, complete_lease)
 
 
 def from_scratch(config_option: vim.vm.ConfigOption) -> CreateVMSpec:
     return CreateVMSpec(config_option)
 
 
-def from_ovf(ovf_url: str) -> OvfImportSpec:
-    return OvfImportSpec(ovf_url)
+def from_ovf(
+    ovf_url: str,
+    ssl_thumbprints: Mapping[str, str] = None
+) -> OvfImportSpec:
+    return OvfImportSpec(ovf_url, ssl_thumbprints)
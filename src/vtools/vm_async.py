@@ -0,0 +1,56 @@
+import asyncio
+from functools import partial
+from typing import (
+    Callable,
+    Iterable
+)
+
+from pyVmomi import vim
+
+from vtools.vm import (
+    VM,
+    run_power_tasks
+)
+
+_POWERED_ON = vim.VirtualMachine.PowerState.poweredOn
+_POWERED_OFF = vim.VirtualMachine.PowerState.poweredOff
+_SUSPENDED = vim.VirtualMachine.PowerState.suspended
+
+
+async def power_on(vm: VM) -> None:
+    await power_on_many([vm])
+
+
+async def power_off(vm: VM) -> None:
+    await power_off_many([vm])
+
+
+async def suspend(vm: VM) -> None:
+    await suspend_many([vm])
+
+
+async def power_on_many(vms: Iterable[VM]) -> None:
+    await _run_power_tasks(vms, lambda vm: vm.vim_obj.PowerOn(), _POWERED_ON)
+
+
+async def power_off_many(vms: Iterable[VM]) -> None:
+    await _run_power_tasks(vms, lambda vm: vm.vim_obj.PowerOff(),
+                           _POWERED_OFF)
+
+
+async def suspend_many(vms: Iterable[VM]) -> None:
+    await _run_power_tasks(vms, lambda vm: vm.vim_obj.Suspend(), _SUSPENDED)
+
+
+async def _run_power_tasks(
+    vms: Iterable[VM],
+    start_task: Callable[[VM], vim.Task],
+    target_state: vim.VirtualMachine.PowerState
+) -> None:
+    # One WaitForUpdatesEx loop on the executor waits for the whole batch,
+    # instead of polling task.info once per VM
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(
+        None,
+        partial(run_power_tasks, list(vms), start_task, target_state)
+    )
@@ -1,60 +1,394 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import (
+    lru_cache,
+    partial
+)
 from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
     List,
+    Mapping,
     Optional,
+    Sequence,
+    Tuple,
     Type
 )
+from xml.etree import ElementTree
 
 import requests
-from pyVim.task import WaitForTask
-from pyVmomi import vim
+from pyVim.connect import SmartStubAdapter
+from pyVmomi import (
+    vim,
+    vmodl
+)
 from pyVmomi.VmomiSupport import ManagedObject
-from requests.compat import urljoin
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_fixed,
-    TryAgain
+from requests.adapters import HTTPAdapter
+from requests.compat import (
+    urljoin,
+    urlparse
 )
+from urllib3.util.retry import Retry
 
+from vtools.async_tasks import get_property_collector
+from vtools.exception import DeviceOptionNotFoundError
 
-def list_vim_obj(
+_LEASE_PROGRESS_INTERVAL_IN_SECONDS = 60
+_TASK_POLL_INITIAL_INTERVAL_IN_SECONDS = 0.25
+_TASK_POLL_MAX_INTERVAL_IN_SECONDS = 5
+_TASK_UNFINISHED_STATES = (vim.TaskInfo.State.queued,
+                           vim.TaskInfo.State.running)
+_STREAM_VMDK_CONTENT_TYPE = 'application/x-vnd.vmware-streamVmdk'
+_LEASE_READY_TIMEOUT_IN_SECONDS = 600
+_LEASE_SETTLED_STATES = (vim.HttpNfcLease.State.ready,
+                         vim.HttpNfcLease.State.error)
+_HTTP_POOL_CONNECTIONS = 4
+_HTTP_POOL_MAXSIZE = 8
+_HTTP_MAX_RETRIES = 3
+_HTTP_RETRY_BACKOFF_FACTOR = 0.3
+_HTTP_RETRY_STATUSES = (502, 503, 504)
+# Only idempotent requests without a streamed body may be replayed
+_HTTP_RETRY_METHODS = frozenset({'GET', 'HEAD'})
+_OVF_DESCRIPTOR_TIMEOUT_IN_SECONDS = (5, 30)
+_NETWORK_CACHE_TTL_IN_SECONDS = 300
+_DEFAULT_OVF_ENCODING = 'utf-8-sig'
+_DEFAULT_OVF_NETWORK_NAME = 'VM Network'
+_OVF_NAMESPACES = ('http://schemas.dmtf.org/ovf/envelope/1',
+                   'http://schemas.dmtf.org/ovf/envelope/2')
+_XML_ENCODING_PATTERN = re.compile(
+    rb'\s*<\?xml[^>]*?encoding=["\']([A-Za-z0-9._-]+)["\']'
+)
+_DEVICE_OPTION_INDEX_CACHE_SIZE = 32
+_RETRIEVE_MAX_OBJECTS = 1000
+_PROPERTY_SPEC_CACHE_SIZE = 64
+_RETRIEVE_OPTIONS = vmodl.query.PropertyCollector.RetrieveOptions(
+    maxObjects=_RETRIEVE_MAX_OBJECTS
+)
+_VIEW_TRAVERSAL_SPEC = vmodl.query.PropertyCollector.TraversalSpec(
+    name='traverseView',
+    type=vim.view.ContainerView,
+    path='view',
+    skip=False
+)
+
+
+def _create_http_session() -> requests.Session:
+    session = requests.Session()
+    max_retries = Retry(total=_HTTP_MAX_RETRIES,
+                        backoff_factor=_HTTP_RETRY_BACKOFF_FACTOR,
+                        status_forcelist=_HTTP_RETRY_STATUSES,
+                        allowed_methods=_HTTP_RETRY_METHODS)
+    adapter = HTTPAdapter(pool_connections=_HTTP_POOL_CONNECTIONS,
+                          pool_maxsize=_HTTP_POOL_MAXSIZE,
+                          max_retries=max_retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_http_session = _create_http_session()
+
+_network_cache: Dict[Any, Tuple[float, Dict[str, ManagedObject]]] = {}
+_network_cache_lock = threading.Lock()
+
+_device_option_indexes: Dict[
+    int,
+    Tuple[vim.vm.ConfigOption, Dict[type, vim.vm.device.VirtualDeviceOption]]
+] = {}
+
+
+def close_http_session() -> None:
+    _http_session.close()
+
+
+def resume_session(
+    host: str,
+    session_cookie: str
+) -> vim.ServiceInstance:
+    stub = SmartStubAdapter(host=host, disableSslCertValidation=True)
+    stub.cookie = session_cookie
+    return vim.ServiceInstance("ServiceInstance", stub)
+
+
+@contextmanager
+def container_view(
     content: vim.ServiceInstanceContent,
-    vim_type: Type[vim.ManagedEntity],
-    container_vim_obj: vim.ManagedEntity = None,
+    container_vim_obj: vim.ManagedEntity,
+    vim_types: List[Type[vim.ManagedEntity]],
     recurse: bool = True
-) -> List[ManagedObject]:
+) -> Iterator[vim.view.ContainerView]:
+    view = content.viewManager.CreateContainerView(container_vim_obj,
+                                                   vim_types,
+                                                   recurse)
+    try:
+        yield view
+    finally:
+        view.Destroy()
+
+
+class ContainerViewCache:
+    def __init__(self, content: vim.ServiceInstanceContent) -> None:
+        self.content = content
+        self._views = {}
+
+    def __enter__(self) -> 'ContainerViewCache':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def get(
+        self,
+        container_vim_obj: vim.ManagedEntity,
+        vim_type: Type[vim.ManagedEntity],
+        recurse: bool = True
+    ) -> vim.view.ContainerView:
+        key = (container_vim_obj, vim_type, recurse)
+        view = self._views.get(key)
+        if view is None:
+            view = self.content.viewManager.CreateContainerView(
+                container_vim_obj, [vim_type], recurse
+            )
+            self._views[key] = view
+        return view
+
+    def close(self) -> None:
+        while self._views:
+            _, view = self._views.popitem()
+            try:
+                view.Destroy()
+            except vmodl.fault.ManagedObjectNotFound:
+                # Already gone server-side; keep destroying the others
+                pass
+
+
+@contextmanager
+def _open_view(
+    content: vim.ServiceInstanceContent,
+    container_vim_obj: vim.ManagedEntity,
+    vim_type: Type[vim.ManagedEntity],
+    recurse: bool,
+    view_cache: Optional[ContainerViewCache]
+) -> Iterator[vim.view.ContainerView]:
     if not container_vim_obj:
         container_vim_obj = content.rootFolder
 
-    types_in_view = [vim_type]
-    container_view = content.viewManager.CreateContainerView(container_vim_obj,
-                                                             types_in_view,
-                                                             recurse)
-    vim_obj_list = list(container_view.view)
-    container_view.Destroy()
-    return vim_obj_list
+    if view_cache is not None:
+        yield view_cache.get(container_vim_obj, vim_type, recurse)
+        return
+    with container_view(content, container_vim_obj, [vim_type],
+                        recurse) as view:
+        yield view
+
+
+def list_vim_obj(
+    content: vim.ServiceInstanceContent,
+    vim_type: Type[vim.ManagedEntity],
+    container_vim_obj: vim.ManagedEntity = None,
+    recurse: bool = True,
+    view_cache: ContainerViewCache = None
+) -> List[ManagedObject]:
+    with _open_view(content, container_vim_obj, vim_type, recurse,
+                    view_cache) as view:
+        return list(view.view)
 
 
 def get_first_vim_obj(
     content: vim.ServiceInstanceContent,
     vim_type: Type[vim.ManagedEntity],
     container_vim_obj: vim.ManagedEntity = None,
-    recurse: bool = True
+    recurse: bool = True,
+    view_cache: ContainerViewCache = None
 ) -> Optional[ManagedObject]:
-    vim_obj_list = list_vim_obj(content, vim_type, container_vim_obj, recurse)
-    if len(vim_obj_list) > 0:
-        return vim_obj_list[0]
-    return None
+    with _open_view(content, container_vim_obj, vim_type, recurse,
+                    view_cache) as view:
+        vim_objs = view.view
+        return vim_objs[0] if vim_objs else None
+
+
+def retrieve_properties(
+    content: vim.ServiceInstanceContent,
+    object_specs: Sequence[vmodl.query.PropertyCollector.ObjectSpec],
+    vim_type: Type[vim.ManagedEntity],
+    path_set: Sequence[str]
+) -> List[Tuple[ManagedObject, Dict[str, Any]]]:
+    filter_spec = vmodl.query.PropertyCollector.FilterSpec(
+        objectSet=list(object_specs),
+        propSet=[_property_spec(vim_type, tuple(path_set))]
+    )
+    property_collector = content.propertyCollector
+
+    results = []
+    result = property_collector.RetrievePropertiesEx([filter_spec],
+                                                     _RETRIEVE_OPTIONS)
+    while result is not None:
+        for object_content in result.objects:
+            # Unset properties are left out of propSet; seed them with None
+            # so callers can tell "unset" from "never requested"
+            props = dict.fromkeys(path_set)
+            props.update((prop.name, prop.val)
+                         for prop in object_content.propSet)
+            results.append((object_content.obj, props))
+        if result.token is None:
+            break
+        result = property_collector.ContinueRetrievePropertiesEx(result.token)
+    return results
+
+
+@lru_cache(maxsize=_PROPERTY_SPEC_CACHE_SIZE)
+def _property_spec(
+    vim_type: Type[vim.ManagedEntity],
+    path_set: Tuple[str, ...]
+) -> vmodl.query.PropertyCollector.PropertySpec:
+    # Shared between calls, so callers must never mutate the result
+    return vmodl.query.PropertyCollector.PropertySpec(
+        type=vim_type,
+        pathSet=list(path_set)
+    )
+
+
+def collect_properties(
+    content: vim.ServiceInstanceContent,
+    vim_type: Type[vim.ManagedEntity],
+    path_set: Sequence[str],
+    container_vim_obj: vim.ManagedEntity = None,
+    recurse: bool = True,
+    view_cache: ContainerViewCache = None
+) -> Dict[ManagedObject, Dict[str, Any]]:
+    with _open_view(content, container_vim_obj, vim_type, recurse,
+                    view_cache) as view:
+        object_spec = vmodl.query.PropertyCollector.ObjectSpec(
+            obj=view,
+            skip=True,
+            selectSet=[_VIEW_TRAVERSAL_SPEC]
+        )
+        return dict(retrieve_properties(content, [object_spec], vim_type,
+                                        path_set))
+
+
+def wait_for_updates(
+    vim_obj: ManagedObject,
+    path_set: Sequence[str],
+    is_done: Callable[[Dict[str, Any]], bool],
+    timeout: float = 600,
+    max_wait_seconds: int = 30
+) -> Dict[str, Any]:
+    property_collector = get_property_collector(
+        vim_obj._stub
+    ).CreatePropertyCollector()
+    try:
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(
+            objectSet=[vmodl.query.PropertyCollector.ObjectSpec(obj=vim_obj)],
+            propSet=[
+                vmodl.query.PropertyCollector.PropertySpec(
+                    type=type(vim_obj),
+                    pathSet=list(path_set)
+                )
+            ]
+        )
+        property_collector.CreateFilter(filter_spec, True)
+
+        props = {}
+        version = None
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(
+                    f'{vim_obj!r} did not reach the expected state '
+                    f'within {timeout} seconds: {props}'
+                )
+
+            wait_options = vmodl.query.PropertyCollector.WaitOptions(
+                maxWaitSeconds=max(1, min(max_wait_seconds, int(remaining)))
+            )
+            update_set = property_collector.WaitForUpdatesEx(version,
+                                                             wait_options)
+            if update_set is not None:
+                version = update_set.version
+                for filter_update in update_set.filterSet:
+                    for object_update in filter_update.objectSet:
+                        for change in object_update.changeSet:
+                            props[change.name] = change.val
+
+            if is_done(props):
+                return props
+    finally:
+        property_collector.Destroy()
+
+
+def _get_task_result(task_info: vim.TaskInfo) -> Any:
+    if task_info.state == vim.TaskInfo.State.error:
+        raise task_info.error
+    return task_info.result
+
+
+def wait_for_task(
+    task: vim.Task,
+    initial_interval: float = _TASK_POLL_INITIAL_INTERVAL_IN_SECONDS,
+    max_interval: float = _TASK_POLL_MAX_INTERVAL_IN_SECONDS
+) -> Any:
+    interval = initial_interval
+    task_info = task.info
+    while task_info.state in _TASK_UNFINISHED_STATES:
+        time.sleep(interval)
+        interval = min(interval * 2, max_interval)
+        task_info = task.info
+    return _get_task_result(task_info)
+
+
+async def wait_for_task_async(
+    task: vim.Task,
+    initial_interval: float = _TASK_POLL_INITIAL_INTERVAL_IN_SECONDS,
+    max_interval: float = _TASK_POLL_MAX_INTERVAL_IN_SECONDS
+) -> Any:
+    loop = asyncio.get_running_loop()
+    interval = initial_interval
+    task_info = await loop.run_in_executor(None, lambda: task.info)
+    while task_info.state in _TASK_UNFINISHED_STATES:
+        await asyncio.sleep(interval)
+        interval = min(interval * 2, max_interval)
+        task_info = await loop.run_in_executor(None, lambda: task.info)
+    return _get_task_result(task_info)
 
 
 def find_device_option_by_type(
+    config_option: vim.vm.ConfigOption,
+    device_type: Type[vim.vm.device.VirtualDevice],
+    default: vim.vm.device.VirtualDeviceOption = None
+) -> vim.vm.device.VirtualDeviceOption:
+    cached = _device_option_indexes.get(id(config_option))
+    if cached is None or cached[0] is not config_option:
+        if len(_device_option_indexes) >= _DEVICE_OPTION_INDEX_CACHE_SIZE:
+            _device_option_indexes.pop(next(iter(_device_option_indexes)))
+        index = {}
+        for device_option in (
+            config_option.hardwareOptions.virtualDeviceOption
+        ):
+            index.setdefault(device_option.type, device_option)
+        # Keeping the ConfigOption in the entry stops its id being reused
+        cached = (config_option, index)
+        _device_option_indexes[id(config_option)] = cached
+    return cached[1].get(device_type, default)
+
+
+def get_device_option_or_raise(
     config_option: vim.vm.ConfigOption,
     device_type: Type[vim.vm.device.VirtualDevice]
 ) -> vim.vm.device.VirtualDeviceOption:
-    for device_option in config_option.hardwareOptions.virtualDeviceOption:
-        if device_option.type == device_type:
-            return device_option
-    return None
+    device_option = find_device_option_by_type(config_option, device_type)
+    if device_option is None:
+        raise DeviceOptionNotFoundError(
+            f'{device_type.__name__} is not supported by '
+            f'hardware version {config_option.version}'
+        )
+    return device_option
 
 
 def get_vim_obj_by_name(
@@ -62,13 +396,53 @@ def get_vim_obj_by_name(
     vim_type: Type[vim.ManagedEntity],
     name: str,
     container_vim_obj: vim.ManagedEntity = None,
-    recurse: bool = True
+    recurse: bool = True,
+    view_cache: ContainerViewCache = None
 ) -> Optional[ManagedObject]:
-    vim_obj_list = list_vim_obj(content, vim_type, container_vim_obj, recurse)
-    for vim_obj in vim_obj_list:
-        if vim_obj.name == name:
-            return vim_obj
-    return None
+    if container_vim_obj is not None:
+        # FindChild only looks at direct children, so a miss still has to
+        # fall back to scanning the container
+        child = content.searchIndex.FindChild(container_vim_obj, name)
+        if isinstance(child, vim_type):
+            return child
+        if not recurse:
+            return None
+
+    return get_vim_obj_name_index(content, vim_type, container_vim_obj,
+                                  recurse, view_cache).get(name)
+
+
+def get_vim_obj_name_index(
+    content: vim.ServiceInstanceContent,
+    vim_type: Type[vim.ManagedEntity],
+    container_vim_obj: vim.ManagedEntity = None,
+    recurse: bool = True,
+    view_cache: ContainerViewCache = None
+) -> Dict[str, ManagedObject]:
+    names = collect_properties(content, vim_type, ['name'],
+                               container_vim_obj, recurse, view_cache)
+    name_index = {}
+    for vim_obj, props in names.items():
+        name_index.setdefault(props.get('name'), vim_obj)
+    return name_index
+
+
+def read_ovf_descriptor(ovf_url: str) -> str:
+    if os.path.isfile(ovf_url):
+        with open(ovf_url, 'rb') as ovf_file:
+            raw_descriptor = ovf_file.read()
+    else:
+        response = _http_session.get(
+            ovf_url,
+            timeout=_OVF_DESCRIPTOR_TIMEOUT_IN_SECONDS
+        )
+        response.raise_for_status()
+        raw_descriptor = response.content
+
+    match = _XML_ENCODING_PATTERN.match(raw_descriptor)
+    encoding = (match.group(1).decode('ascii') if match
+                else _DEFAULT_OVF_ENCODING)
+    return raw_descriptor.decode(encoding)
 
 
 def create_import_spec(
@@ -77,11 +451,10 @@ def create_import_spec(
     resource_pool_vim_obj: vim.ResourcePool,
     datastore_vim_obj: vim.Datastore,
     vm_name: str = None,
-    disk_provisioning: str = None
+    disk_provisioning: str = None,
+    view_cache: ContainerViewCache = None
 ) -> vim.OvfManager.CreateImportSpecResult:
-    response = requests.get(ovf_url)
-    response.encoding = "utf-8"
-    ovf_descriptor = response.text
+    ovf_descriptor = read_ovf_descriptor(ovf_url)
 
     spec_params = vim.OvfManager.CreateImportSpecParams()
 
@@ -90,19 +463,89 @@ def create_import_spec(
     if disk_provisioning is not None:
         spec_params.diskProvisioning = disk_provisioning
 
-    spec_params.networkMapping = []
+    network_index = _get_network_index(content, view_cache)
+    spec_params.networkMapping = [
+        vim.OvfManager.NetworkMapping(name=network_name,
+                                      network=network_index[network_name])
+        for network_name in _list_ovf_network_names(ovf_descriptor)
+        if network_name in network_index
+    ]
 
-    network_mapping = vim.OvfManager.NetworkMapping()
-    network_mapping.name = "VM Network"
-    network_mapping.network = get_vim_obj_by_name(content=content,
-                                                  vim_type=vim.Network,
-                                                  name="VM Network")
-    spec_params.networkMapping.append(network_mapping)
+    try:
+        return content.ovfManager.CreateImportSpec(ovf_descriptor,
+                                                   resource_pool_vim_obj,
+                                                   datastore_vim_obj,
+                                                   spec_params)
+    except Exception:
+        invalidate_network_cache()
+        raise
 
-    return content.ovfManager.CreateImportSpec(ovf_descriptor,
-                                               resource_pool_vim_obj,
-                                               datastore_vim_obj,
-                                               spec_params)
+
+async def create_import_spec_async(
+    content: vim.ServiceInstanceContent,
+    ovf_url: str,
+    resource_pool_vim_obj: vim.ResourcePool,
+    datastore_vim_obj: vim.Datastore,
+    vm_name: str = None,
+    disk_provisioning: str = None
+) -> vim.OvfManager.CreateImportSpecResult:
+    # Descriptor downloads share the pooled keep-alive session, so
+    # concurrent imports from one OVF repo reuse its connections
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None,
+        partial(create_import_spec,
+                content=content,
+                ovf_url=ovf_url,
+                resource_pool_vim_obj=resource_pool_vim_obj,
+                datastore_vim_obj=datastore_vim_obj,
+                vm_name=vm_name,
+                disk_provisioning=disk_provisioning)
+    )
+
+
+def _list_ovf_network_names(ovf_descriptor: str) -> List[str]:
+    try:
+        envelope = ElementTree.fromstring(ovf_descriptor)
+    except ElementTree.ParseError:
+        # Let CreateImportSpec report what is wrong with the descriptor
+        return [_DEFAULT_OVF_NETWORK_NAME]
+
+    network_names = []
+    for namespace in _OVF_NAMESPACES:
+        for network in envelope.iter(f'{{{namespace}}}Network'):
+            network_name = network.get(f'{{{namespace}}}name')
+            if network_name is not None and network_name not in network_names:
+                network_names.append(network_name)
+    return network_names or [_DEFAULT_OVF_NETWORK_NAME]
+
+
+def _get_network_index(
+    content: vim.ServiceInstanceContent,
+    view_cache: ContainerViewCache = None
+) -> Dict[str, vim.Network]:
+    # The stub identifies the connection; ESXi has no instanceUuid
+    key = content.propertyCollector._stub
+    with _network_cache_lock:
+        cached = _network_cache.get(key)
+    if (
+        cached is not None
+        and
+        time.monotonic() - cached[0] < _NETWORK_CACHE_TTL_IN_SECONDS
+    ):
+        return cached[1]
+
+    network_index = get_vim_obj_name_index(content=content,
+                                           vim_type=vim.Network,
+                                           view_cache=view_cache)
+    with _network_cache_lock:
+        _network_cache[key] = (time.monotonic(), network_index)
+    return network_index
+
+
+def invalidate_network_cache() -> None:
+    with _network_cache_lock:
+        _network_cache.clear()
 
 
 def create_http_nfc_lease(resource_pool_vim_obj: vim.ResourcePool,
@@ -111,28 +554,98 @@ def create_http_nfc_lease(resource_pool_vim_obj: vim.ResourcePool,
     http_nfc_lease = resource_pool_vim_obj.ImportVApp(spec_vim_obj,
                                                       folder_vim_obj)
 
-    @retry(stop=stop_after_attempt(6),
-           wait=wait_fixed(5))
-    def wait_until_http_nfc_lease_ready():
-        lease_state = http_nfc_lease.state
-        if lease_state != vim.HttpNfcLease.State.ready:
-            raise TryAgain
-
-    wait_until_http_nfc_lease_ready()
+    props = wait_for_updates(
+        http_nfc_lease,
+        ['state', 'error'],
+        lambda props: props.get('state') in _LEASE_SETTLED_STATES,
+        timeout=_LEASE_READY_TIMEOUT_IN_SECONDS
+    )
+    if props['state'] == vim.HttpNfcLease.State.error:
+        raise props['error']
 
     return http_nfc_lease
 
 
-def deploy_vm_with_pull_mode(ovf_url, import_spec, http_nfc_lease):
-    source_files = []
-    for file in import_spec.fileItem:
-        source_file = vim.HttpNfcLease.SourceFile(
-            targetDeviceId=file.deviceId,
-            url=urljoin(ovf_url, file.path),
-            sslThumbprint="",
-            create=file.create
-        )
-        source_files.append(source_file)
-    task = http_nfc_lease.PullFromUrls(source_files)
-    WaitForTask(task)
-    return task
+def pull_from_urls(
+    ovf_url: str,
+    import_spec: vim.OvfManager.CreateImportSpecResult,
+    http_nfc_lease: vim.HttpNfcLease,
+    ssl_thumbprints: Mapping[str, str] = None
+) -> vim.Task:
+    ssl_thumbprints = ssl_thumbprints or {}
+    source_files = [
+        _build_source_file(urljoin(ovf_url, file.path), file,
+                           ssl_thumbprints)
+        for file in import_spec.fileItem
+    ]
+    return http_nfc_lease.PullFromUrls(source_files)
+
+
+def _build_source_file(
+    url: str,
+    file_item: vim.OvfManager.FileItem,
+    ssl_thumbprints: Mapping[str, str]
+) -> vim.HttpNfcLease.SourceFile:
+    # Without a thumbprint for the source host ESXi skips verification
+    return vim.HttpNfcLease.SourceFile(
+        targetDeviceId=file_item.deviceId,
+        url=url,
+        sslThumbprint=ssl_thumbprints.get(urlparse(url).hostname, ""),
+        create=file_item.create
+    )
+
+
+def push_to_urls(
+    ovf_path: str,
+    import_spec: vim.OvfManager.CreateImportSpecResult,
+    http_nfc_lease: vim.HttpNfcLease,
+    host: str
+) -> None:
+    ovf_dir = os.path.dirname(os.path.abspath(ovf_path))
+    file_items = {file.deviceId: file for file in import_spec.fileItem}
+    uploads = []
+    for device_url in http_nfc_lease.info.deviceUrl:
+        file_item = file_items.get(device_url.importKey)
+        if file_item is None:
+            continue
+        file_path = os.path.join(ovf_dir, file_item.path)
+        uploads.append((device_url.url.replace('*', host), file_path,
+                        file_item.create))
+
+    total_size = sum(os.path.getsize(file_path)
+                     for _, file_path, _ in uploads)
+    uploaded_size = 0
+    stopped = threading.Event()
+
+    def keep_lease_alive():
+        while not stopped.wait(_LEASE_PROGRESS_INTERVAL_IN_SECONDS):
+            percent = uploaded_size * 100 // total_size if total_size else 0
+            http_nfc_lease.Progress(min(percent, 99))
+
+    keepalive = threading.Thread(target=keep_lease_alive, daemon=True)
+    keepalive.start()
+    try:
+        for url, file_path, create in uploads:
+            file_size = os.path.getsize(file_path)
+            # Passing a file object with an explicit Content-Length makes
+            # requests stream the body instead of using chunked encoding.
+            headers = {'Content-Length': str(file_size)}
+            if create:
+                # Items the server creates itself (ISO, nvram) are PUT
+                method = 'PUT'
+                headers['Overwrite'] = 't'
+            else:
+                method = 'POST'
+                headers['Content-Type'] = _STREAM_VMDK_CONTENT_TYPE
+            with open(file_path, 'rb') as upload_file:
+                response = _http_session.request(method,
+                                                 url,
+                                                 data=upload_file,
+                                                 headers=headers,
+                                                 verify=False)
+            response.raise_for_status()
+            uploaded_size += file_size
+    finally:
+        stopped.set()
+        keepalive.join()
+